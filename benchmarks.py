@@ -0,0 +1,397 @@
+import random
+import sys
+import time
+
+import numpy as np
+
+import bond_ledger
+import loanable_funds
+import pure_circulation
+import pure_consumption
+import pure_optimization_lib
+
+
+def timed(function, repeat=1):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# object model vs struct-of-arrays model of the pure circulation economy
+def benchmark_circulation(agents=100000, rounds=10):
+    rng = random.Random(0)
+    people = [
+        pure_circulation.Person(rng.uniform(0.5, 0.9), rng.choice([0, 30, 60]), rng.choice([0, 25, 50]))
+        for _ in range(agents)
+    ]
+    sim = pure_circulation.Simulation()
+    sim.people = people
+    vectorized = pure_circulation.VectorizedSimulation.from_people(people)
+
+    def run_objects():
+        for _ in range(rounds):
+            sim.round()
+
+    def run_vectorized():
+        for _ in range(rounds):
+            vectorized.round()
+
+    objects_time = timed(run_objects, repeat=3)
+    vectorized_time = timed(run_vectorized, repeat=3)
+    print("Circulation {0} agents x {1} rounds: objects {2:.3f}s, vectorized {3:.4f}s, speedup {4:.0f}x".format(
+        agents, rounds, objects_time, vectorized_time, objects_time / vectorized_time))
+
+    vectorized.checker = pure_circulation.InvariantChecker(raise_on_leak=False)
+    checked_time = timed(run_vectorized, repeat=3)
+    print("Circulation {0} agents x {1} rounds: vectorized with invariant checks {2:.4f}s, overhead {3:.0f}%".format(
+        agents, rounds, checked_time, 100 * (checked_time / vectorized_time - 1)))
+
+
+# one batched simulation with a scenario axis vs one simulation per scenario
+def benchmark_circulation_batch(scenarios=1000, agents=100, rounds=10):
+    rng = np.random.default_rng(0)
+    consumption_rate = rng.uniform(0.5, 0.9, (scenarios, agents))
+    max_saving = rng.choice([0, 30, 60], (scenarios, agents))
+    max_debt = rng.choice([0, 25, 50], (scenarios, agents))
+    shock_rounds = rng.integers(1, rounds, scenarios)
+
+    def run_loop():
+        for s in range(scenarios):
+            shocks = pure_circulation.ShockSchedule().add("max_debt", shock_rounds[s], 0)
+            sim = pure_circulation.VectorizedSimulation(consumption_rate[s], max_saving[s], max_debt[s], shocks=shocks)
+            for _ in range(rounds):
+                sim.round()
+
+    def run_batch():
+        shocks = pure_circulation.ShockSchedule().add("max_debt", shock_rounds, 0, np.arange(scenarios))
+        sim = pure_circulation.VectorizedSimulation(consumption_rate, max_saving, max_debt, shocks=shocks)
+        for _ in range(rounds):
+            sim.round()
+
+    loop_time = timed(run_loop)
+    batch_time = timed(run_batch, repeat=3)
+    print("Circulation {0} scenarios x {1} agents x {2} rounds: loop {3:.3f}s, batch {4:.4f}s, speedup {5:.0f}x".format(
+        scenarios, agents, rounds, loop_time, batch_time, loop_time / batch_time))
+
+
+def random_agents(count, productions=3, seed=0):
+    spec = pure_optimization_lib.generate_economy(count, productions=(productions, productions), seed=seed)
+    return pure_optimization_lib.build_agents(spec)
+
+
+# GDP model construction from summed optlang expressions vs the sparse builder
+def benchmark_model_build(agent_counts=(5, 10, 20, 40, 80, 200), expression_limit=40):
+    for count in agent_counts:
+        agents = random_agents(count)
+
+        def build_expressions():
+            model = pure_optimization_lib.Model(name="expressions")
+            model.objective = pure_optimization_lib.objective_from_agents(agents)
+            model.add(pure_optimization_lib.batch_constraints(agents))
+            model.add(pure_optimization_lib.time_constraints(agents))
+            model.add(pure_optimization_lib.global_constraints(agents))
+            model.update()
+
+        def build_sparse():
+            builder = pure_optimization_lib.SparseModelBuilder(agents)
+            builder.add_batch_constraints().add_time_constraints().add_global_constraints()
+            builder.build("sparse").update()
+
+        sparse_time = timed(build_sparse)
+        if count <= expression_limit:
+            expression_time = timed(build_expressions)
+            print("Model build {0} agents: expressions {1:.3f}s, sparse {2:.3f}s, speedup {3:.1f}x".format(
+                count, expression_time, sparse_time, expression_time / sparse_time))
+        else:
+            print("Model build {0} agents: sparse {1:.3f}s".format(count, sparse_time))
+
+
+# model size and construction time of large economies with a sparse trade network
+def benchmark_network_build(agent_counts=(1000, 10000), graph="nearest", degree=4):
+    for count in agent_counts:
+        start = time.perf_counter()
+        spec = pure_optimization_lib.generate_economy(count, graph=graph, degree=degree, seed=0)
+        builder = pure_optimization_lib.SparseModelBuilder(pure_optimization_lib.build_agents(spec))
+        builder.add_batch_constraints().add_time_constraints().add_global_constraints()
+        model = builder.build("network")
+        model.update()
+        print("Network build {0} agents, {1} edges: {2} variables, {3} constraints in {4:.3f}s".format(
+            count, len(spec.edges), len(model.variables), len(model.constraints), time.perf_counter() - start))
+
+# rebuilding and solving the GDP model from scratch after every edit vs updating and warm starting one model
+def benchmark_warm_start(agents=4, edits=50, seed=0):
+    rng = random.Random(seed)
+    spec = pure_optimization_lib.generate_economy(agents, seed=seed)
+    incremental = pure_optimization_lib.IncrementalModel(pure_optimization_lib.build_agents(spec))
+    incremental.optimize()
+    cold_time = 0
+    warm_time = 0
+    warm_solves = 0
+    for _ in range(edits):
+        agent = rng.choice(incremental.agents)
+        if rng.random() < 0.5:
+            incremental.set_max_time(agent.id, rng.randint(10, 40))
+        else:
+            incremental.set_time_needed(agent.id, rng.choice(agent.production).id, rng.randint(2, 8))
+
+        start = time.perf_counter()
+        incremental.optimize()
+        warm_time += time.perf_counter() - start
+        warm_solves += incremental.warm
+
+        edited = pure_optimization_lib.EconomySpec(
+            [agent.max_time for agent in incremental.agents],
+            [[(prod.batch_size, prod.time_needed) for prod in agent.production] for agent in incremental.agents],
+            spec.edges)
+        start = time.perf_counter()
+        builder = pure_optimization_lib.SparseModelBuilder(pure_optimization_lib.build_agents(edited))
+        builder.add_batch_constraints().add_time_constraints().add_global_constraints()
+        builder.build("cold").optimize()
+        cold_time += time.perf_counter() - start
+    print("Re-solve {0} agents x {1} edits: cold {2:.3f}s, incremental {3:.3f}s ({4} warm started), speedup {5:.1f}x".format(
+        agents, edits, cold_time, warm_time, warm_solves, cold_time / warm_time))
+
+# economies of a few agent types repeated, solved as they are and after presolve
+def benchmark_presolve(agents=6, types=2, seeds=range(4), timeout=10):
+    for seed in seeds:
+        base = pure_optimization_lib.generate_economy(types, productions=(2, 3), batch_size=(2, 6), time_needed=(3, 7), seed=seed)
+        spec = pure_optimization_lib.EconomySpec(
+            [30] * agents, [base.productions[i % types] for i in range(agents)], None)
+        _, report = pure_optimization_lib.presolve(spec)
+        results = {}
+        times = {}
+        for presolved in (False, True):
+            start = time.perf_counter()
+            results[presolved] = pure_optimization_lib.solve_spec(spec, timeout=timeout, presolved=presolved)
+            times[presolved] = time.perf_counter() - start
+        print("Presolve seed {0}: {1} variables removed, {2} symmetry constraints added, "
+              "plain {3} {4} in {5:.3f}s, presolved {6} {7} in {8:.3f}s".format(
+                  seed, report.removed_variables, report.added_constraints,
+                  results[False].status, results[False].objective, times[False],
+                  results[True].status, results[True].objective, times[True]))
+
+# LP bound and greedy barter solution vs the MILP, which only finishes for small economies
+def benchmark_heuristic(agent_counts=(4, 6, 20, 100), milp_limit=6, timeout=10):
+    for count in agent_counts:
+        spec = pure_optimization_lib.generate_economy(count, seed=count)
+        start = time.perf_counter()
+        heuristic = pure_optimization_lib.solve_heuristic(spec, max_gap=1.0)
+        heuristic_time = time.perf_counter() - start
+        line = "Heuristic {0} agents: bound {1:.1f}, greedy {2} (gap {3:.1%}) in {4:.3f}s".format(
+            count, heuristic.bound, heuristic.result.objective, heuristic.gap, heuristic_time)
+        if count <= milp_limit:
+            start = time.perf_counter()
+            exact = pure_optimization_lib.solve_spec(spec, timeout=timeout)
+            line += ", MILP {0} {1} in {2:.3f}s".format(exact.status, exact.objective, time.perf_counter() - start)
+        print(line)
+
+# Lagrangian decomposition on trade networks far beyond what the MILP solves
+def benchmark_decomposition(agent_counts=(1000, 10000), graph="nearest"):
+    for count in agent_counts:
+        spec = pure_optimization_lib.generate_economy(count, graph=graph, seed=count)
+        start = time.perf_counter()
+        decomposition = pure_optimization_lib.solve_lagrangian(spec)
+        print("Decomposition {0} agents: bound {1:.1f}, feasible {2} (gap {3:.1%}) in {4:.3f}s".format(
+            count, decomposition.bound, decomposition.result.objective, decomposition.gap, time.perf_counter() - start))
+
+# barter in cycles of growing length, cycles of two are pairwise barter
+def benchmark_barter_cycles(agent_counts=(5, 8), lengths=(2, 3, 4), timeout=20):
+    for count in agent_counts:
+        spec = pure_optimization_lib.generate_economy(count, seed=count)
+        for length in lengths:
+            cycle_model = pure_optimization_lib.BarterCycleModel(pure_optimization_lib.build_agents(spec), length)
+            cycle_model.model.configuration.timeout = timeout
+            start = time.perf_counter()
+            status = cycle_model.optimize()
+            print("Barter cycles {0} agents, length <= {1}: {2} GDP {3}, LP bound {4:.1f}, {5} cycles in {6:.3f}s".format(
+                count, length, status, cycle_model.model.objective.value, cycle_model.bound,
+                len(cycle_model.cycle_vars), time.perf_counter() - start))
+
+
+# matching throughput of one order book, every tenth order cancels an earlier resting order
+def benchmark_order_book(orders=1000000, seed=0):
+    rng = np.random.default_rng(seed)
+    sides = np.where(rng.random(orders) < 0.5, pure_consumption.BUY, pure_consumption.SELL).tolist()
+    prices = np.round(rng.normal(100, 1, orders), 2).tolist()
+    quantities = rng.integers(1, 11, orders).tolist()
+    cancels = rng.random(orders) < 0.1
+    offers = [pure_consumption.MarketOffer(None, "WATER", quantities[k], prices[k], sides[k]) for k in range(orders)]
+    book = pure_consumption.OrderBook("WATER")
+    fills = 0
+    start = time.perf_counter()
+    for k, offer in enumerate(offers):
+        fills += len(book.place(offer))
+        if cancels[k]:
+            book.cancel(offers[k // 2])
+    elapsed = time.perf_counter() - start
+    print("Order book {0} orders: {1} fills, {2} resting in {3:.3f}s, {4:.0f} orders/s".format(
+        orders, fills, len(book), elapsed, orders / elapsed))
+
+
+# one call auction over every good vs the order book matching the same offers one good at a time
+def benchmark_call_auction(goods=2, offers=1000000, book_offers=100000, seed=0):
+    rng = np.random.default_rng(seed)
+    bid_prices = np.round(rng.normal(100, 1, (goods, offers)), 2)
+    ask_prices = np.round(rng.normal(100, 1, (goods, offers)), 2)
+    bid_quantities = rng.integers(1, 11, (goods, offers)).astype(float)
+    ask_quantities = rng.integers(1, 11, (goods, offers)).astype(float)
+    start = time.perf_counter()
+    result = pure_consumption.call_auction(bid_prices, bid_quantities, ask_prices, ask_quantities)
+    elapsed = time.perf_counter() - start
+    print("Call auction {0} goods x {1} bids and asks: prices {2}, volume {3} in {4:.3f}s".format(
+        goods, offers, np.round(result.prices, 2).tolist(), result.volumes.tolist(), elapsed))
+
+    start = time.perf_counter()
+    for g in range(goods):
+        book = pure_consumption.OrderBook(g)
+        for k in range(book_offers):
+            book.place(pure_consumption.MarketOffer(None, g, bid_quantities[g, k], bid_prices[g, k], pure_consumption.BUY))
+            book.place(pure_consumption.MarketOffer(None, g, ask_quantities[g, k], ask_prices[g, k], pure_consumption.SELL))
+    elapsed = time.perf_counter() - start
+    print("Order book {0} goods x {1} bids and asks: {2:.3f}s".format(goods, book_offers, elapsed))
+
+
+# one consumption round on the agent table vs the same round through every person's inventory view
+def benchmark_agent_table(agents=1000000, people=100000, seed=0):
+    rng = np.random.default_rng(seed)
+    table = pure_consumption.AgentTable()
+    table.add_agents(agents)
+    table.inventory[:] = rng.integers(0, 8, table.inventory.shape)
+    table.health[:] = 20
+    desired = np.full((agents, 2), 3.0)
+    good_ids = [table.good_id("WATER"), table.good_id("FOOD")]
+    elapsed = timed(lambda: table.consume(good_ids, desired))
+    print("Agent table {0} agents: consumption round {1:.4f}s, {2} bytes of arrays per agent".format(
+        agents, elapsed, (table.inventory.shape[1] + 1) * table.inventory.itemsize))
+
+    table = pure_consumption.AgentTable()
+    population = [pure_consumption.Person(0.05, table) for _ in range(people)]
+    elapsed = timed(lambda: [person.consumption_behavior.consume(person) for person in population])
+    print("Agent table {0} people: consumption round through inventory views {1:.4f}s, {2} bytes per view".format(
+        people, elapsed, sys.getsizeof(population[0].inventory)))
+
+
+# price search of a budget constrained exchange economy
+def benchmark_tatonnement(agents=1000000, good_counts=(2, 10), seed=0):
+    rng = np.random.default_rng(seed)
+    for goods in good_counts:
+        cash = rng.uniform(0, 20, agents)
+        inventory = rng.integers(0, 10, (agents, goods)).astype(float)
+        weights = rng.uniform(0.5, 2, (agents, goods))
+        shares = 0.5 * weights / weights.sum(axis=1, keepdims=True)
+        start = time.perf_counter()
+        result = pure_consumption.tatonnement(
+            lambda prices: (pure_consumption.budget_demand(prices, cash, inventory, shares) - inventory).sum(axis=0),
+            np.ones(goods), inventory.sum(axis=0))
+        print("Tatonnement {0} agents x {1} goods: converged {2} after {3} iterations in {4:.3f}s, max relative excess demand {5:.1e}".format(
+            agents, goods, result.converged, result.iterations, time.perf_counter() - start,
+            np.abs(result.excess_demand / inventory.sum(axis=0)).max()))
+
+
+# budget allocation of every agent by bisection on the multiplier
+def benchmark_budget_allocation(agents=1000000, goods=2, seed=0):
+    rng = np.random.default_rng(seed)
+    health = rng.uniform(1, 20, agents)
+    cash = rng.uniform(0, 20, agents)
+    prices = rng.uniform(0.5, 3, goods)
+    desired = rng.integers(1, 5, (agents, goods)).astype(float)
+    start = time.perf_counter()
+    allocation = pure_consumption.allocate_budget(health, cash, prices, desired)
+    elapsed = time.perf_counter() - start
+    # marginal utility of the cash kept against the multiplier, agents without cash left are at the corner
+    kept = allocation.multiplier < 1 - 1e-9
+    error = np.abs(1 / (1 + allocation.cash[kept]) / allocation.multiplier[kept] - 1).max()
+    print("Budget allocation {0} agents x {1} goods: {2:.3f}s, max relative marginal utility gap {3:.1e}".format(
+        agents, goods, elapsed, error))
+
+
+# production plans of stable rounds, with prices inside the threshold, vs rounds that move prices beyond it
+def benchmark_production_planning(agents=1000000, goods=10, rounds=10, seed=0):
+    rng = np.random.default_rng(seed)
+    table = pure_consumption.AgentTable([str(g) for g in range(goods)])
+    table.add_agents(agents)
+    table.productivity[:] = rng.uniform(0.5, 2, (agents, goods))
+    table.inventory[:] = rng.integers(0, 5, (agents, goods))
+    table.cash[:] = rng.uniform(0, 20, agents)
+    table.hours[:] = 8
+    desired = np.full((agents, goods), 3.0)
+    good_ids = list(range(goods))
+    base = rng.uniform(0.5, 2, goods)
+    for label, jitter in (("stable", 0.01), ("moving", 0.5)):
+        planner = pure_consumption.ProductionPlanner(threshold=0.05)
+        prices = [base * rng.uniform(1 - jitter, 1 + jitter, goods) for _ in range(rounds)]
+        elapsed = timed(lambda: [planner.plan(table, good_ids, desired, p) for p in prices])
+        print("Production planning {0} agents x {1} goods, {2} {3} rounds: {4:.3f}s, coefficients computed {5} times".format(
+            agents, goods, rounds, label, elapsed, planner.updates))
+
+
+# one round of a ledger with tens of millions of outstanding contracts
+def benchmark_bond_ledger(contracts=20000000, agents=1000000, horizon=120, seed=0):
+    rng = np.random.default_rng(seed)
+    issued = rng.integers(0, horizon, contracts)
+    columns = (rng.uniform(100, 1000, contracts), rng.uniform(0.01, 0.1, contracts), issued,
+               issued + rng.integers(1, horizon, contracts), rng.integers(0, agents, contracts), rng.integers(0, agents, contracts))
+    ledger = bond_ledger.BondLedger()
+    start = time.perf_counter()
+    ledger.issue(*columns)
+    issue_time = time.perf_counter() - start
+    accrue_time = timed(lambda: ledger.accrue(horizon))
+    start = time.perf_counter()
+    settlement = ledger.settle(horizon)
+    payments = bond_ledger.net_payments(settlement, agents)
+    settle_time = time.perf_counter() - start
+    index_time = timed(lambda: ledger.portfolio(0))
+    lookup_time = timed(lambda: ledger.portfolio(1), repeat=1000)
+    print("Bond ledger {0} contracts: issue {1:.2f}s, accrue {2:.3f}s, settle {3} contracts {4:.4f}s (net {5:.1e}), "
+          "portfolio index {6:.2f}s, portfolio lookup {7:.1e}s".format(
+              contracts, issue_time, accrue_time, len(settlement.contracts), settle_time, payments.sum(),
+              index_time, lookup_time))
+
+
+# full clearing of the credit market vs clearing after a few agents changed their reservation rate
+def benchmark_loanable_funds(agents=1000000, changed_share=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    market = loanable_funds.LoanableFundsMarket(agents)
+    lenders = rng.random(agents) < 0.5
+    market.set_amounts(np.where(lenders, rng.uniform(0, 100, agents), 0), np.where(lenders, 0, rng.uniform(0, 100, agents)))
+    rates = rng.uniform(0.01, 0.2, agents)
+    full_time = timed(lambda: (market.set_rates(np.arange(agents), rates), market.clear()))
+    changed = rng.choice(agents, int(agents * changed_share), replace=False)
+    start = time.perf_counter()
+    market.set_rates(changed, rng.uniform(0.01, 0.2, len(changed)))
+    clearing = market.clear()
+    incremental_time = time.perf_counter() - start
+    start = time.perf_counter()
+    contracts = loanable_funds.match_contracts(clearing.lent, clearing.borrowed)
+    match_time = time.perf_counter() - start
+    print("Loanable funds {0} agents: sort and clear {1:.3f}s, {2} new rates and clear {3:.3f}s, "
+          "rate {4:.4f}, {5} contracts matched in {6:.3f}s".format(
+              agents, full_time, len(changed), incremental_time, clearing.rate, len(contracts[2]), match_time))
+
+
+BENCHMARKS = {
+    "circulation": benchmark_circulation,
+    "circulation_batch": benchmark_circulation_batch,
+    "model_build": benchmark_model_build,
+    "network_build": benchmark_network_build,
+    "warm_start": benchmark_warm_start,
+    "presolve": benchmark_presolve,
+    "heuristic": benchmark_heuristic,
+    "decomposition": benchmark_decomposition,
+    "barter_cycles": benchmark_barter_cycles,
+    "order_book": benchmark_order_book,
+    "call_auction": benchmark_call_auction,
+    "agent_table": benchmark_agent_table,
+    "tatonnement": benchmark_tatonnement,
+    "budget_allocation": benchmark_budget_allocation,
+    "production_planning": benchmark_production_planning,
+    "bond_ledger": benchmark_bond_ledger,
+    "loanable_funds": benchmark_loanable_funds,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
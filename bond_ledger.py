@@ -0,0 +1,162 @@
+import collections
+
+import numpy as np
+
+# columns of the ledger, every contract is one row of every column
+COLUMNS = collections.OrderedDict([
+    # contract id, rows are in the order of their ids
+    ("id", np.int64),
+    ("principal", np.float64),
+    ("rate", np.float64),
+    # principal plus the interest accrued so far
+    ("value", np.float64),
+    ("issued", np.int32),
+    ("maturity", np.int32),
+    ("holder", np.int32),
+    ("issuer", np.int32),
+    ("active", np.bool_),
+])
+
+# stable order of round numbers, numpy sorts keys of 16 bits with a radix sort and rounds rarely span more
+def round_order(rounds):
+    if len(rounds) and rounds.max() - rounds.min() < 2 ** 16:
+        return np.argsort((rounds - rounds.min()).astype(np.uint16), kind="stable")
+    return np.argsort(rounds, kind="stable")
+
+Settlement = collections.namedtuple("Settlement", ["contracts", "holders", "issuers", "amounts"])
+
+# bonds and debt contracts as parallel arrays
+#
+# a contract pays back its principal and interest as a lump sum at maturity, interest compounds every round.
+# contracts are bucketed by the round they mature in, so settling a round only touches the contracts that mature
+# in it. portfolios come from an index of the contracts sorted by holder, it is rebuilt the first time it is
+# needed after contracts were issued or transferred and after that a portfolio is one slice of it, minus the
+# contracts settled since. settled contracts are dropped from the columns once they make up half of them.
+# contracts keep the id issue returned them for good, rows move when settled contracts are dropped
+class BondLedger:
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.settled = 0
+        self.next_id = 0
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in COLUMNS.items()}
+        # maturity round -> list of arrays of rows
+        self.maturities = collections.defaultdict(list)
+        self.by_holder = None
+        self.holder_starts = None
+
+    # ledger.principal, ledger.holder, ... are the columns of all contracts in the ledger
+    def __getattr__(self, name):
+        if name in COLUMNS and "columns" in self.__dict__:
+            return self.columns[name][:self.size]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return self.size - self.settled
+
+    # rows of the given contract ids
+    def rows(self, contracts):
+        contracts = np.atleast_1d(np.asarray(contracts, dtype=np.int64))
+        rows = np.searchsorted(self.id, contracts)
+        known = rows < self.size
+        known[known] = self.id[rows[known]] == contracts[known]
+        if not known.all():
+            raise ValueError("unknown contracts {0}".format(contracts[~known].tolist()))
+        return rows
+
+    # adds contracts, every argument is a scalar or one value per contract, returns the ids of the new contracts
+    def issue(self, principal, rate, issued, maturity, holder, issuer):
+        principal, rate, issued, maturity, holder, issuer = np.broadcast_arrays(
+            *[np.atleast_1d(x) for x in (principal, rate, issued, maturity, holder, issuer)])
+        count = len(principal)
+        if count == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self.size + count > len(self.columns["active"]):
+            capacity = max(2 * len(self.columns["active"]), self.size + count)
+            self.columns = {
+                name: np.concatenate([column, np.zeros(capacity - len(column), column.dtype)])
+                for name, column in self.columns.items()}
+        rows = np.arange(self.size, self.size + count)
+        ids = np.arange(self.next_id, self.next_id + count)
+        self.size += count
+        self.next_id += count
+        for name, values in (("id", ids), ("principal", principal), ("rate", rate), ("value", principal),
+                             ("issued", issued), ("maturity", maturity), ("holder", holder), ("issuer", issuer),
+                             ("active", True)):
+            self.columns[name][rows] = values
+        order = round_order(maturity)
+        rounds = maturity[order]
+        starts = np.flatnonzero(rounds[1:] != rounds[:-1]) + 1
+        for round_index, chunk in zip(rounds[np.concatenate([[0], starts])].tolist(), np.split(rows[order], starts)):
+            self.maturities[round_index].append(chunk)
+        self.by_holder = None
+        return ids
+
+    def transfer(self, contracts, holder):
+        rows = self.rows(contracts)
+        if not self.active[rows].all():
+            settled = self.id[rows[~self.active[rows]]]
+            raise ValueError("settled contracts {0} cannot be transferred".format(settled.tolist()))
+        self.columns["holder"][rows] = holder
+        self.by_holder = None
+
+    # interest of round_index on every active contract issued before it, a contract that is settled at maturity
+    # has accrued maturity - issued rounds of interest
+    def accrue(self, round_index):
+        value = self.value
+        np.multiply(value, 1 + self.rate, out=value, where=self.active & (self.issued < round_index))
+
+    # pays out the contracts maturing in round_index, holders receive and issuers pay the amounts
+    def settle(self, round_index):
+        chunks = self.maturities.pop(round_index, [])
+        rows = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+        rows = rows[self.active[rows]]
+        self.columns["active"][rows] = False
+        self.settled += len(rows)
+        settlement = Settlement(self.id[rows], self.holder[rows], self.issuer[rows], self.value[rows])
+        if self.settled > self.size // 2:
+            self.compact()
+        return settlement
+
+    # active contracts of a holder
+    def portfolio(self, holder):
+        if self.by_holder is None:
+            holders = self.holder
+            self.by_holder = np.argsort(holders)
+            self.holder_starts = np.concatenate([[0], np.cumsum(np.bincount(holders))])
+        if holder + 1 >= len(self.holder_starts):
+            return self.id[:0]
+        rows = self.by_holder[self.holder_starts[holder]:self.holder_starts[holder + 1]]
+        return self.id[rows[self.active[rows]]]
+
+    # drops the rows of settled contracts, contract ids stay the same
+    def compact(self):
+        active = self.active
+        renumber = np.cumsum(active) - 1
+        self.columns = {name: column[:self.size][active] for name, column in self.columns.items()}
+        self.size = len(self.columns["active"])
+        self.settled = 0
+        for round_index, chunks in list(self.maturities.items()):
+            rows = np.concatenate(chunks)
+            rows = rows[active[rows]]
+            self.maturities[round_index] = [renumber[rows]] if len(rows) else []
+        self.by_holder = None
+
+# cash flow of every agent in a settlement
+def net_payments(settlement, agents):
+    return (np.bincount(settlement.holders, settlement.amounts, agents)
+            - np.bincount(settlement.issuers, settlement.amounts, agents))
+
+if __name__ == "__main__":
+    # lump sum contracts of 1000 at 5% for 12 rounds like main.DebtDemand, issued by agent 0 to agents 1 to 3
+    ledger = BondLedger()
+    for round_index in range(3):
+        ledger.issue(1000, 0.05, round_index, round_index + 12, round_index + 1, 0)
+    ledger.transfer(ledger.portfolio(3), 1)
+    print("Portfolio of agent 1: {0}".format(ledger.portfolio(1).tolist()))
+    for round_index in range(16):
+        ledger.accrue(round_index)
+        settlement = ledger.settle(round_index)
+        if len(settlement.contracts):
+            print("Round {0}: settled {1} contracts, payments {2}".format(
+                round_index, len(settlement.contracts), np.round(net_payments(settlement, 4), 2).tolist()))
+    print("Outstanding contracts: {0}".format(len(ledger)))
@@ -0,0 +1,100 @@
+import collections
+import sys
+import time
+
+import numpy as np
+
+CreditClearing = collections.namedtuple("CreditClearing", ["rate", "volume", "lent", "borrowed"])
+
+# market for loanable funds, every agent has one reservation interest rate
+#
+# lenders lend at their reservation rate or above it, borrowers borrow at their reservation rate or below it.
+# agents stay sorted by reservation rate between rounds. new rates for k agents take them out of the order and merge
+# them back in with a binary search, O(n + k log n) instead of sorting all agents again, new amounts keep the order.
+# clearing builds the cumulative supply and demand curves over the order and picks the rate with the largest volume,
+# ties go to the smallest imbalance and then to the lowest rate. the long side is rationed pro rata
+class LoanableFundsMarket:
+    def __init__(self, agents):
+        self.rates = np.zeros(agents)
+        self.supply = np.zeros(agents)
+        self.demand = np.zeros(agents)
+        self.order = np.arange(agents)
+        # agents merged back into the order so far
+        self.moved = 0
+
+    def set_amounts(self, supply, demand, agents=slice(None)):
+        self.supply[agents] = supply
+        self.demand[agents] = demand
+
+    def set_rates(self, agents, rates):
+        agents = np.atleast_1d(agents)
+        rates = np.broadcast_to(np.asarray(rates, dtype=float), agents.shape)
+        changed = rates != self.rates[agents]
+        agents = agents[changed]
+        if len(agents) == 0:
+            return
+        self.rates[agents] = rates[changed]
+        moving = np.zeros(len(self.rates), dtype=bool)
+        moving[agents] = True
+        keep = self.order[~moving[self.order]]
+        agents = agents[np.argsort(self.rates[agents], kind="stable")]
+        positions = np.searchsorted(self.rates[keep], self.rates[agents], side="right")
+        self.order = np.insert(keep, positions, agents)
+        self.moved += len(agents)
+
+    def clear(self):
+        rates = self.rates[self.order]
+        supply = np.cumsum(self.supply[self.order])
+        demand = np.cumsum(self.demand[self.order][::-1])[::-1]
+        # lenders at or below and borrowers at or above the rate of every position, agents with the same rate included
+        supply = supply[np.searchsorted(rates, rates, side="right") - 1]
+        demand = demand[np.searchsorted(rates, rates, side="left")]
+        volume = np.minimum(supply, demand)
+        best = volume.max(initial=0)
+        if best <= 0:
+            return CreditClearing(np.nan, 0.0, np.zeros_like(self.supply), np.zeros_like(self.demand))
+        rate = rates[np.argmin(np.where(volume == best, np.abs(supply - demand), np.inf))]
+        lenders = self.supply * (self.rates <= rate)
+        borrowers = self.demand * (self.rates >= rate)
+        return CreditClearing(rate, best, lenders * (best / lenders.sum()), borrowers * (best / borrowers.sum()))
+
+# pairs lenders with borrowers for the cleared amounts, returns (lenders, borrowers, amounts) of the contracts
+# the lent and the borrowed amounts are laid end to end on one line each and every overlap of a lender with a
+# borrower becomes a contract, so there are fewer contracts than lenders and borrowers together
+def match_contracts(lent, borrowed):
+    lenders = np.flatnonzero(lent > 0)
+    borrowers = np.flatnonzero(borrowed > 0)
+    if len(lenders) == 0 or len(borrowers) == 0:
+        return lenders[:0], borrowers[:0], np.zeros(0)
+    lent_ends = np.cumsum(lent[lenders])
+    borrowed_ends = np.cumsum(borrowed[borrowers])
+    total = min(lent_ends[-1], borrowed_ends[-1])
+    ends = np.union1d(np.minimum(lent_ends, total), np.minimum(borrowed_ends, total))
+    starts = np.concatenate([[0], ends[:-1]])
+    amounts = ends - starts
+    # both lines only differ by rounding, slivers of rounding are no contracts
+    real = amounts > total * 1e-12
+    middles = (starts[real] + ends[real]) / 2
+    return (lenders[np.searchsorted(lent_ends, middles)], borrowers[np.searchsorted(borrowed_ends, middles)],
+            amounts[real])
+
+if __name__ == "__main__":
+    agents = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng = np.random.default_rng(0)
+    market = LoanableFundsMarket(agents)
+    lenders = rng.random(agents) < 0.5
+    market.set_amounts(np.where(lenders, rng.uniform(0, 100, agents), 0), np.where(lenders, 0, rng.uniform(0, 100, agents)))
+    start = time.perf_counter()
+    market.set_rates(np.arange(agents), rng.uniform(0.01, 0.2, agents))
+    clearing = market.clear()
+    print("{0} agents: rate {1:.4f}, volume {2:.0f} in {3:.3f}s".format(
+        agents, clearing.rate, clearing.volume, time.perf_counter() - start))
+    changed = rng.choice(agents, agents // 100, replace=False)
+    start = time.perf_counter()
+    market.set_rates(changed, rng.uniform(0.01, 0.2, len(changed)))
+    clearing = market.clear()
+    print("{0} new reservation rates: rate {1:.4f}, volume {2:.0f} in {3:.3f}s".format(
+        len(changed), clearing.rate, clearing.volume, time.perf_counter() - start))
+    start = time.perf_counter()
+    lenders, borrowers, amounts = match_contracts(clearing.lent, clearing.borrowed)
+    print("{0} contracts in {1:.3f}s".format(len(amounts), time.perf_counter() - start))
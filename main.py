@@ -1,6 +1,11 @@
 import itertools
 import math
 
+import numpy as np
+
+import bond_ledger
+import loanable_funds
+
 
 class ConsumptionBehavior:
     def __init__(self, fixed, income_pct, networth_pct):
@@ -14,35 +19,25 @@ class ConsumptionBehavior:
         return self.fixed + discretionary + wealth_spending
 
     def possible_consumption(self, person):
-        return min(person.cash, self.desired_consumption(person))
+        return max(0, min(person.cash, self.desired_consumption(person)))
 
 class Person:
     def __init__(self, tp):
         self.productivityMultiplier = 1
         self.hoursPerDay = 8
         self.lifetimeIncome = 0
+        self.income = 0
         self.cash = 10
+        # cash plus the bonds held minus the debt owed
+        self.networth = self.cash
+        self.consumption = 0
+        self.investment = 0
         self.products = 0
         self.minimum_standard_of_living = 6
         self.standard_of_living = 0
         self.health = 100
         self.time_preference = tp
         self.consumption_behavior = ConsumptionBehavior(6, 0.10, 0.03)
-        self.held_bonds = [BondOffer()]
-
-# assuming lump sum at the end of the contract
-class DebtDemand:
-    def __init__(self, tp):
-        self.principal = 1000
-        self.interest_rate = 0.05
-        self.duration = 12
-
-# assuming lump sum at the end of the contract
-class BondOffer:
-    def __init__(self, tp):
-        self.principal = 1000
-        self.interest_rate = 0.05
-        self.due_date = 12
 
 class Simulation:
     def __init__(self):
@@ -67,13 +62,21 @@ class Simulation:
             #{'duration': 1000, 'productivity': 0.16},
             #{'duration': 1000, 'productivity': 0.16}
         ]
-        self.available_borrowers = [] # borrowers looking for lenders
-        self.bonds_supply = [] # lenders trying to sell bonds
+        self.round_index = 0
+        # bonds and debt of everyone, agent k is people[k]
+        # assuming lump sum at the end of the contract
+        self.ledger = bond_ledger.BondLedger()
+        self.contract_duration = 12
+        # lenders and borrowers looking for each other, the reservation rate of a person is the time preference
+        self.credit_market = loanable_funds.LoanableFundsMarket(len(self.people))
+        self.market_rate = math.nan
 
     def work_and_earn(self, price):
         balance = 0
         for person in self.people:
             income = price * person.productivityMultiplier * person.hoursPerDay
+            person.income = income
+            person.lifetimeIncome += income
             person.cash += income
             balance += income
         return balance
@@ -88,46 +91,70 @@ class Simulation:
             balance -= spending
         return balance
 
+    # interest accrues on every contract and the contracts maturing this round are paid back
+    def settle_contracts(self):
+        self.ledger.accrue(self.round_index)
+        payments = bond_ledger.net_payments(self.ledger.settle(self.round_index), len(self.people))
+        for person, payment in zip(self.people, payments):
+            person.cash += payment
+
+    def update_networth(self):
+        value = self.ledger.value * self.ledger.active
+        held = np.bincount(self.ledger.holder, value, len(self.people))
+        owed = np.bincount(self.ledger.issuer, value, len(self.people))
+        for person, bonds, debt in zip(self.people, held, owed):
+            person.networth = person.cash + bonds - debt
+
     def consumption_vs_savings(self):
+        # only people whose time preference changed move in the order of the credit market
+        self.credit_market.set_rates(np.arange(len(self.people)), [person.time_preference for person in self.people])
+        supply = np.zeros(len(self.people))
+        demand = np.zeros(len(self.people))
+
         # divide remaining cash balance into consumption or investment
-        for person in self.people:
+        for k, person in enumerate(self.people):
 
             d_cons = person.consumption_behavior.desired_consumption(person)
-            p_cons = person.consumption_behavior.possible_consumption(person)
+            p_cons = person.consumption
 
             if d_cons > p_cons:
-                # sell held bonds first
-                if person.held_bonds:
-                    # pick the bond with the biggest difference between personal valuation and market valuation
-                    # this is getting too complicated...
-
-
-                # sell investment or borrow money if the interest rate is below time preference
-                # which investments should be sold first?
-                # this is where time preference can actually help us!
-                # we can calculate the net present value of any investment
-                # and look if the market price is above that present value
-                # the problem is I don't know how to model
-                # the investments...
-
+                # borrow money if the interest rate is below time preference
+                # selling held bonds first is left out, picking the bond with the biggest difference between
+                # personal valuation and market valuation is getting too complicated...
+                demand[k] = d_cons - p_cons
             else:
-                # buy
-
-            person.investment = 0
+                # lend the remaining cash if the interest rate is above time preference
+                supply[k] = person.cash
+
+        self.credit_market.set_amounts(supply, demand)
+        clearing = self.credit_market.clear()
+        self.market_rate = clearing.rate
+        lenders, borrowers, amounts = loanable_funds.match_contracts(clearing.lent, clearing.borrowed)
+        self.ledger.issue(amounts, clearing.rate, self.round_index, self.round_index + self.contract_duration, lenders, borrowers)
+        for person, lent, borrowed in zip(self.people, clearing.lent, clearing.borrowed):
+            person.cash -= lent
+            person.investment = lent
+            # borrowed money is spent on the missing consumption
+            person.consumption += borrowed
 
     def round(self):
         # assume that the minimum wage is the same for everyone
         # this wage can only be improved by being more productive
         balance = 0
 
+        # bonds and debt maturing this round are paid back
+        self.settle_contracts()
+
         # work and earn phase, every product gets sold
         price = 1
         balance += self.work_and_earn(price)
+        self.update_networth()
 
         # consume minimum standard of living
         balance -= self.initial_consumption(price)
 
-        #self.consumption_vs_savings()
+        self.consumption_vs_savings()
+        self.round_index += 1
 
         # and we are about to allocate 20000 worth of savings with a yield of 4%, how much will any given person invest?
         #
@@ -166,3 +193,13 @@ class Simulation:
         # p8=1% = 8000 / 25886 = 0,3090
         # p9=4% = 2000 / 25886 = 0,0772
 
+if __name__ == "__main__":
+    sim = Simulation()
+    # the last three people earn too little to pay their bills and have to borrow
+    for person in sim.people[-3:]:
+        person.productivityMultiplier = 0.5
+    for i in range(36):
+        sim.round()
+        print("Round {0}: rate {1:.2f}, lent {2:.2f}, outstanding contracts {3}, cash {4:.2f}, networth {5}".format(
+            i, sim.market_rate, sum(person.investment for person in sim.people), len(sim.ledger),
+            sum(person.cash for person in sim.people), [round(float(person.networth), 1) for person in sim.people]))
@@ -1,3 +1,9 @@
+import collections
+import json
+import os
+
+import numpy as np
+
 class Person:
     def __init__(self, consumption_rate, max_saving, max_debt):
         self.income = 0
@@ -15,13 +21,77 @@ class Person:
         self.productivity = 1
         self.next_income = 50
 
-class Simulation:
+# per person state that is carried from one round to the next
+PERSON_STATE = [
+    "income", "consumed_income", "saved_income", "repayment_income", "borrowed_income", "wealth_change",
+    "savings", "debt", "next_income"
+]
+
+# parameter shocks declared up front instead of being coded into the driver loop
+# a shock added for round r sets the parameter of every person after round r has been computed
+# scenario -1 means every scenario, a simulation without a scenario axis is scenario 0
+# a shock of one scenario wins over a shock of every scenario, among equal ones the last one added wins
+# with several scenario axes a scenario is an index into the first one and the shock covers all scenarios below it
+class ShockSchedule:
     def __init__(self):
+        self.shocks_by_parameter = {}
+
+    # after_round, value and scenarios broadcast against each other,
+    # so one call can declare a different shock timing or size for every scenario
+    def add(self, parameter, after_round, value, scenarios=-1):
+        after_round, value, scenarios = np.broadcast_arrays(
+            np.asarray(after_round, dtype=int), np.asarray(value, dtype=float), np.asarray(scenarios, dtype=int))
+        rounds, values, shocked_scenarios = self.shocks_by_parameter.get(
+            parameter, (np.zeros(0, dtype=int), np.zeros(0), np.zeros(0, dtype=int)))
+        self.shocks_by_parameter[parameter] = (
+            np.concatenate([rounds, after_round.ravel()]),
+            np.concatenate([values, value.ravel()]),
+            np.concatenate([shocked_scenarios, scenarios.ravel()]))
+        return self
+
+    # yields (parameter, values, scenarios) for every parameter shocked after the given round
+    def due(self, round_index):
+        for parameter, (rounds, values, scenarios) in self.shocks_by_parameter.items():
+            due = rounds == round_index
+            if due.any():
+                yield parameter, values[due], scenarios[due]
+
+    # the last round after which a shock is still pending, -1 if there are none
+    def last_round(self):
+        return max([rounds.max() for rounds, _, _ in self.shocks_by_parameter.values() if len(rounds)] + [-1])
+
+    # the shocks of scenarios start to stop - 1, numbered from 0, for simulating those scenarios on their own
+    def scenario_range(self, start, stop):
+        schedule = ShockSchedule()
+        for parameter, (rounds, values, scenarios) in self.shocks_by_parameter.items():
+            keep = (scenarios < 0) | ((scenarios >= start) & (scenarios < stop))
+            schedule.add(parameter, rounds[keep], values[keep], np.where(scenarios[keep] < 0, -1, scenarios[keep] - start))
+        return schedule
+
+    # plain lists for a json file, floats keep their exact value through repr
+    def to_dict(self):
+        return {
+            parameter: {"rounds": rounds.tolist(), "values": values.tolist(), "scenarios": scenarios.tolist()}
+            for parameter, (rounds, values, scenarios) in self.shocks_by_parameter.items()
+        }
+
+    @classmethod
+    def from_dict(cls, shocks):
+        schedule = cls()
+        for parameter, shock in shocks.items():
+            schedule.add(parameter, shock["rounds"], shock["values"], shock["scenarios"])
+        return schedule
+
+class Simulation:
+    def __init__(self, shocks=None, recorder=None):
         self.people = [
             Person(0.6, 60, 0),
             Person(0.6, 0, 50),
             Person(0.6, 0, 50)
         ]
+        self.round_index = 0
+        self.shocks = shocks or ShockSchedule()
+        self.recorder = recorder
 
     def round(self):
         for p in self.people:
@@ -70,9 +140,6 @@ class Simulation:
         for p in self.people:
             repayment_supply += p.repayment_income
 
-        print("Capital Market: loanable_funds {0} borrower_demand {1}".format(loanable_funds, borrower_demand))
-        print("Capital Market: repayment_demand {0} repayment_supply {1}".format(repayment_demand, repayment_supply))
-
         # find equilibrium values
         borrowed_vs_desired = 1
         savings_vs_desired = 1
@@ -81,8 +148,6 @@ class Simulation:
         if loanable_funds > borrower_demand:
             savings_vs_desired = borrower_demand / loanable_funds
 
-        print("Equilibrium: borrowed_vs_desired {0}, savings_vs_desired {1}".format(borrowed_vs_desired, savings_vs_desired))
-
         # clear lender/borrower market
         for p in self.people:
             # allocate debt according to propensity to borrow
@@ -107,8 +172,6 @@ class Simulation:
         else:
             repayment_vs_demand = repayment_supply / repayment_demand
 
-        print("Equilibrium: repayment_vs_demand {0}".format(repayment_vs_demand))
-
         # clear repayment
         for p in self.people:
             repayment_spending = repayment_vs_demand * p.savings
@@ -132,6 +195,50 @@ class Simulation:
         for p in self.people:
             p.next_income = p.productivity * price
 
+        # aggregates of this round
+        self.loanable_funds = loanable_funds
+        self.borrower_demand = borrower_demand
+        self.repayment_demand = repayment_demand
+        self.repayment_supply = repayment_supply
+        self.borrowed_vs_desired = borrowed_vs_desired
+        self.savings_vs_desired = savings_vs_desired
+        self.repayment_vs_demand = repayment_vs_demand
+        self.aggregate_supply = aggregate_supply
+        self.aggregate_demand = aggregate_demand
+        self.price = price
+
+        self.round_index += 1
+        if self.recorder is not None:
+            self.recorder.record(self)
+        self.apply_shocks()
+
+    def apply_shocks(self):
+        for parameter, values, scenarios in self.shocks.due(self.round_index):
+            own = values[scenarios == 0]
+            values = own if len(own) else values[scenarios < 0]
+            if len(values) == 0:
+                continue
+            # whole numbers stay int like the parameters people are created with
+            value = float(values[-1])
+            if value.is_integer():
+                value = int(value)
+            for p in self.people:
+                setattr(p, parameter, value)
+                if parameter == "consumption_rate":
+                    p.saving_rate = 1 - p.consumption_rate
+
+    # one value per person of a Person attribute
+    def column(self, name):
+        return np.array([getattr(p, name) for p in self.people], dtype=float)
+
+    def snapshot(self):
+        return RoundSnapshot(
+            self.round_index, self.price, self.loanable_funds, self.borrower_demand, self.repayment_vs_demand,
+            sum(p.savings for p in self.people), sum(p.debt for p in self.people))
+
+    def rounds(self, max_rounds=None, until=None):
+        return run_rounds(self, max_rounds, until)
+
     def report(self):
         # report state of economy
         for i in range(0, len(self.people)):
@@ -140,15 +247,474 @@ class Simulation:
             print("Person {0}: Total Income {1}, Borrowed Income {2}, Consumption {3}, Saving {4}, Savings {5} / Max Saving. {6}, Debt {7} / Max Debt {8}".format(*data))
         print("")
 
-sim = Simulation()
-sim.report()
-for i in range(1, 10):
-    print("Round {0}".format(i))
-    sim.round()
+# struct-of-arrays version of Simulation
+# every attribute of Person is stored as one array with an entry per person
+# and every phase of round() is a single masked array operation instead of a loop over people
+#
+# parameters may have leading axes, e.g. shape (scenarios, people), in which case every scenario
+# is an independent economy and all of them step together, markets are cleared along the last axis
+class VectorizedSimulation:
+    def __init__(self, consumption_rate, max_saving, max_debt, productivity=1, next_income=50, shocks=None, recorder=None, checker=None):
+        consumption_rate, max_saving, max_debt, productivity, next_income = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(x, dtype=float)) for x in (consumption_rate, max_saving, max_debt, productivity, next_income)])
+        self.consumption_rate = consumption_rate.copy()
+        self.saving_rate = 1 - self.consumption_rate
+        self.max_saving = max_saving.copy()
+        self.max_debt = max_debt.copy()
+        self.productivity = productivity.copy()
+        self.next_income = next_income.copy()
+        self.income = np.zeros(self.consumption_rate.shape)
+        self.consumed_income = np.zeros(self.consumption_rate.shape)
+        self.saved_income = np.zeros(self.consumption_rate.shape)
+        self.repayment_income = np.zeros(self.consumption_rate.shape)
+        self.borrowed_income = np.zeros(self.consumption_rate.shape)
+        self.wealth_change = np.zeros(self.consumption_rate.shape)
+        self.savings = np.zeros(self.consumption_rate.shape)
+        self.debt = np.zeros(self.consumption_rate.shape)
+        self._scratch_income = np.zeros(self.consumption_rate.shape)
+        self._scratch = np.zeros(self.consumption_rate.shape)
+
+        self.round_index = 0
+        self.shocks = shocks or ShockSchedule()
+        self.recorder = recorder
+        self.checker = checker
+
+        # aggregates of the last round, one per scenario
+        self.loanable_funds = 0
+        self.borrower_demand = 0
+        self.repayment_demand = 0
+        self.repayment_supply = 0
+        self.borrowed_vs_desired = 1
+        self.savings_vs_desired = 1
+        self.repayment_vs_demand = 0
+        self.aggregate_supply = 0
+        self.aggregate_demand = 0
+        self.price = 0
+
+    # copy the complete state of a list of Person objects
+    # if scenarios is given the economy is repeated that many times along a leading scenario axis
+    @classmethod
+    def from_people(cls, people, scenarios=None, shocks=None):
+        shape = (len(people),) if scenarios is None else (scenarios, len(people))
+        sim = cls(
+            np.broadcast_to([p.consumption_rate for p in people], shape),
+            np.broadcast_to([p.max_saving for p in people], shape),
+            np.broadcast_to([p.max_debt for p in people], shape),
+            np.broadcast_to([p.productivity for p in people], shape),
+            np.broadcast_to([p.next_income for p in people], shape),
+            shocks)
+        for name in PERSON_STATE:
+            setattr(sim, name, np.array(np.broadcast_to([getattr(p, name) for p in people], shape), dtype=float))
+        return sim
+
+    # writes the complete state to <path>.npy, one stacked float64 array in CHECKPOINT_ARRAYS order,
+    # and the round index, aggregates of the last round and the shock schedule to <path>.json
+    # recorder and checker only observe the simulation and are not part of its state
+    def save_checkpoint(self, path):
+        np.save(path + ".npy", np.stack([getattr(self, name) for name in CHECKPOINT_ARRAYS]))
+        with open(path + ".json", "w") as f:
+            json.dump({
+                "round_index": self.round_index,
+                "aggregates": {name: np.asarray(getattr(self, name), dtype=float).tolist() for name in CHECKPOINT_AGGREGATES},
+                "shocks": self.shocks.to_dict()
+            }, f)
+
+    # by default the state is memory mapped copy-on-write, so many branches can be restored from one
+    # warm-up checkpoint without reading it up front and without ever changing the file.
+    # replaying rounds from a checkpoint gives bit-identical results to the original run
+    @classmethod
+    def load_checkpoint(cls, path, mmap_mode="c", recorder=None, checker=None):
+        state = np.load(path + ".npy", mmap_mode=mmap_mode)
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        sim = cls.__new__(cls)
+        for i, name in enumerate(CHECKPOINT_ARRAYS):
+            setattr(sim, name, np.asarray(state[i]))
+        sim._scratch_income = np.zeros(sim.income.shape)
+        sim._scratch = np.zeros(sim.income.shape)
+        sim.round_index = meta["round_index"]
+        sim.shocks = ShockSchedule.from_dict(meta["shocks"])
+        sim.recorder = recorder
+        sim.checker = checker
+        for name in CHECKPOINT_AGGREGATES:
+            setattr(sim, name, np.array(meta["aggregates"][name]))
+        return sim
+
+    def __len__(self):
+        return self.income.shape[-1]
+
+    @property
+    def scenarios(self):
+        return self.income.shape[:-1]
+
+    def column(self, name):
+        return getattr(self, name)
+
+    # aggregates are fresh arrays every round, per person arrays are buffers that the next round overwrites
+    def snapshot(self):
+        return RoundSnapshot(
+            self.round_index, self.price, self.loanable_funds, self.borrower_demand, self.repayment_vs_demand,
+            self.savings.sum(axis=-1), self.debt.sum(axis=-1))
+
+    def rounds(self, max_rounds=None, until=None):
+        return run_rounds(self, max_rounds, until)
+
+    def round(self):
+        # all arrays are updated in place, intermediate results live in two scratch buffers
+        # conditional updates multiply by boolean masks, which is much cheaper than np.where
+        # last round's income buffer is reused for next_income at the end of this round
+        self.income, self.next_income = self.next_income, self.income
+        checker = self.checker
+        if checker is not None:
+            checker.begin(self)
+
+        # spending allocation phase
+        saved_income = np.multiply(self.income, self.saving_rate, out=self._scratch_income)
+
+        # use saved_income to pay off debt
+        in_debt = self.debt > self.max_debt
+        np.subtract(self.debt, self.max_debt, out=self.repayment_income)
+        np.minimum(self.repayment_income, saved_income, out=self.repayment_income)
+        self.repayment_income *= in_debt
+        self.debt -= self.repayment_income
+        saved_income -= self.repayment_income
+
+        below_max_saving = self.savings < self.max_saving
+        np.subtract(self.max_saving, self.savings, out=self.saved_income)
+        np.minimum(self.saved_income, saved_income, out=self.saved_income)
+        self.saved_income *= below_max_saving
+        np.subtract(self.income, self.saved_income, out=self.consumed_income)
+        self.consumed_income -= self.repayment_income
+        np.add(self.repayment_income, self.saved_income, out=self.wealth_change)
+
+        # lending, borrowing, dissaving and repaying phases
+        borrowing_capacity = np.subtract(self.max_debt, self.debt, out=self._scratch)
+        np.maximum(borrowing_capacity, 0, out=borrowing_capacity)
+        self.loanable_funds = self.saved_income.sum(axis=-1)
+        self.borrower_demand = borrowing_capacity.sum(axis=-1)
+        # lenders must accept all payments
+        self.repayment_demand = self.savings.sum(axis=-1)
+        self.repayment_supply = self.repayment_income.sum(axis=-1)
+        if checker is not None:
+            checker.check_allocation(self)
+
+        # find equilibrium values
+        self.borrowed_vs_desired = ratio_below_one(self.loanable_funds, self.borrower_demand)
+        self.savings_vs_desired = ratio_below_one(self.borrower_demand, self.loanable_funds)
+
+        # clear lender/borrower market
+        # allocate debt according to propensity to borrow, all debt adds to consumption
+        np.multiply(borrowing_capacity, self.borrowed_vs_desired[..., None], out=self.borrowed_income)
+        self.debt += self.borrowed_income
+        self.consumed_income += self.borrowed_income
+
+        rationed_saved_income = np.multiply(self.saved_income, self.savings_vs_desired[..., None], out=self._scratch)
+        saves = rationed_saved_income > 0
+        # savers consume everything they could not save, everyone else diverts saved_income back to consumption
+        self.consumed_income += self.saved_income
+        self.consumed_income *= ~saves
+        np.multiply(rationed_saved_income, saves, out=self.saved_income)
+        np.subtract(self.income, rationed_saved_income, out=rationed_saved_income)
+        rationed_saved_income *= saves
+        self.consumed_income += rationed_saved_income
+        self.savings += self.saved_income
+        if checker is not None:
+            checker.check_clearing(self)
+
+        # find equilibrium values
+        self.repayment_vs_demand = np.divide(
+            self.repayment_supply, self.repayment_demand,
+            out=np.zeros(self.scenarios), where=self.repayment_demand != 0)
+
+        # clear repayment
+        repayment_spending = np.multiply(self.savings, self.repayment_vs_demand[..., None], out=self._scratch)
+        self.consumed_income += repayment_spending
+        self.savings -= repayment_spending
+        if checker is not None:
+            checker.check_repayment(self, repayment_spending)
+
+        # supply and demand phase
+        self.aggregate_supply = self.productivity.sum(axis=-1)
+        self.aggregate_demand = self.consumed_income.sum(axis=-1)
+
+        # find equilibrium values
+        self.price = self.aggregate_demand / self.aggregate_supply
+
+        # clear supply and demand
+        np.multiply(self.productivity, self.price[..., None], out=self.next_income)
+        if checker is not None:
+            checker.check_market(self)
+
+        self.round_index += 1
+        if self.recorder is not None:
+            self.recorder.record(self)
+        self.apply_shocks()
+
+    def apply_shocks(self):
+        for parameter, values, scenarios in self.shocks.due(self.round_index):
+            people = getattr(self, parameter)
+            everyone = scenarios < 0
+            if everyone.any():
+                people[...] = values[everyone][-1]
+            if people.ndim == 1:
+                if (scenarios == 0).any():
+                    people[...] = values[scenarios == 0][-1]
+            elif not everyone.all():
+                people[scenarios[~everyone]] = values[~everyone].reshape((-1,) + (1,) * (people.ndim - 1))
+            if parameter == "consumption_rate":
+                np.subtract(1, self.consumption_rate, out=self.saving_rate)
+
+    def report(self):
+        # report state of economy
+        for scenario in np.ndindex(*self.scenarios):
+            if scenario:
+                print("Scenario {0}".format(scenario))
+            for i in range(len(self)):
+                person = scenario + (i,)
+                data = [i, self.income[person], self.borrowed_income[person], self.consumed_income[person], self.saved_income[person], self.savings[person], self.max_saving[person], self.debt[person], self.max_debt[person]]
+                print("Person {0}: Total Income {1}, Borrowed Income {2}, Consumption {3}, Saving {4}, Savings {5} / Max Saving. {6}, Debt {7} / Max Debt {8}".format(*data))
+            print("")
+
+# everything VectorizedSimulation carries from one round to the next
+CHECKPOINT_ARRAYS = ["consumption_rate", "saving_rate", "max_saving", "max_debt", "productivity"] + PERSON_STATE
+CHECKPOINT_AGGREGATES = [
+    "loanable_funds", "borrower_demand", "repayment_demand", "repayment_supply", "borrowed_vs_desired",
+    "savings_vs_desired", "repayment_vs_demand", "aggregate_supply", "aggregate_demand", "price"
+]
+
+# a / b where a < b, otherwise 1, used to ration whichever side of the market is larger
+def ratio_below_one(a, b):
+    return np.divide(a, b, out=np.ones(np.shape(a)), where=a < b)
+
+Leak = collections.namedtuple("Leak", ["round_index", "phase", "scenario", "person", "amount"])
+
+class MoneyLeakError(Exception):
+    def __init__(self, leak):
+        Exception.__init__(self, "money leak of {0} in round {1}, phase {2}, scenario {3}, person {4}".format(
+            leak.amount, leak.round_index, leak.phase, leak.scenario, leak.person))
+        self.leak = leak
+
+# accounting invariants of VectorizedSimulation.round()
+#
+# after every phase the flows of money are checked on the aggregate level, which only costs a few sums per round:
+# allocation  income is split into consumption, saving and repayment
+# clearing    every saved unit is lent to a borrower, every person consumes income - saving - repayment + borrowing
+# repayment   every repaid unit reaches a lender and is spent
+# market      aggregate demand becomes next round's aggregate income
+# stocks      savings and debt changed by exactly the flows into and out of them
+#
+# each phase only checks its own flows, so a leak is reported once, in the phase that caused it.
+# only when an aggregate is off by more than the tolerance (relative to aggregate income)
+# the per person residual of that phase is computed to find the first leaking person,
+# market wide invariants have no person and report person None.
+# leaks are raised as MoneyLeakError or, with raise_on_leak=False, collected in leaks
+class InvariantChecker:
+    def __init__(self, tolerance=1e-9, raise_on_leak=True):
+        self.tolerance = tolerance
+        self.raise_on_leak = raise_on_leak
+        self.leaks = []
+
+    def begin(self, sim):
+        self.income = sim.income.sum(axis=-1)
+        self.debt = sim.debt.sum(axis=-1)
+        self.limit = self.tolerance * (1 + np.abs(self.income))
+
+    def check_allocation(self, sim):
+        consumed = sim.consumed_income.sum(axis=-1)
+        self.check(sim, "allocation", consumed + sim.loanable_funds + sim.repayment_supply - self.income,
+                   lambda: sim.consumed_income + sim.saved_income + sim.repayment_income - sim.income)
+
+    def check_clearing(self, sim):
+        self.saved = sim.saved_income.sum(axis=-1)
+        self.borrowed = sim.borrowed_income.sum(axis=-1)
+        self.consumed = sim.consumed_income.sum(axis=-1)
+        self.check(sim, "clearing", self.saved - self.borrowed)
+        self.check(sim, "clearing", self.consumed - (self.income - self.saved - sim.repayment_supply + self.borrowed),
+                   lambda: sim.consumed_income - (sim.income - sim.saved_income - sim.repayment_income + sim.borrowed_income))
+
+    def check_repayment(self, sim, repayment_spending):
+        self.repaid = repayment_spending.sum(axis=-1)
+        self.check(sim, "repayment", self.repaid - sim.repayment_supply)
+        self.check(sim, "repayment", sim.consumed_income.sum(axis=-1) - self.consumed - self.repaid)
+
+    def check_market(self, sim):
+        self.check(sim, "market", sim.next_income.sum(axis=-1) - sim.aggregate_demand)
+        self.check(sim, "stocks", sim.savings.sum(axis=-1) - (sim.repayment_demand + self.saved - self.repaid))
+        self.check(sim, "stocks", sim.debt.sum(axis=-1) - (self.debt - sim.repayment_supply + self.borrowed))
+
+    def check(self, sim, phase, residual, person_residual=None):
+        leaking = np.abs(residual) > self.limit
+        if not leaking.any():
+            return
+        scenario = tuple(int(i) for i in np.argwhere(leaking)[0])
+        amount = float(residual[scenario])
+        person = None
+        if person_residual is not None:
+            person_residual = person_residual()[scenario]
+            people = np.flatnonzero(np.abs(person_residual) > self.tolerance * (1 + np.abs(sim.income[scenario])))
+            if len(people):
+                person = int(people[0])
+                amount = float(person_residual[person])
+        leak = Leak(sim.round_index + 1, phase, scenario, person, amount)
+        if self.raise_on_leak:
+            raise MoneyLeakError(leak)
+        self.leaks.append(leak)
+
+# immutable aggregates of one round, one value per scenario for batched simulations
+RoundSnapshot = collections.namedtuple("RoundSnapshot", [
+    "round_index", "price", "loanable_funds", "borrower_demand", "repayment_vs_demand", "aggregate_savings", "aggregate_debt"
+])
+
+# runs the simulation round by round and yields a RoundSnapshot after each round
+# max_rounds counts from the round the simulation is at, so a run resumed from a checkpoint runs max_rounds more.
+# without max_rounds the run only ends when the steady state detector passed as until fires,
+# which is not allowed to happen while shocks are still pending
+def run_rounds(sim, max_rounds=None, until=None):
+    start = sim.round_index
+    while max_rounds is None or sim.round_index - start < max_rounds:
+        sim.round()
+        snapshot = sim.snapshot()
+        yield snapshot
+        if until is not None and until.update(snapshot) and sim.round_index > sim.shocks.last_round():
+            return
+
+# fires once price and aggregate savings of every scenario stayed within epsilon for `rounds` consecutive rounds
+class SteadyStateDetector:
+    def __init__(self, epsilon=1e-9, rounds=1):
+        self.epsilon = epsilon
+        self.rounds = rounds
+        self.steady_rounds = 0
+        self.last = None
+
+    def update(self, snapshot):
+        if self.last is not None and \
+                np.all(np.abs(snapshot.price - self.last.price) <= self.epsilon) and \
+                np.all(np.abs(snapshot.aggregate_savings - self.last.aggregate_savings) <= self.epsilon):
+            self.steady_rounds += 1
+        else:
+            self.steady_rounds = 0
+        self.last = snapshot
+        return self.steady_rounds >= self.rounds
+
+# constant memory mean, variance, min and max of RoundSnapshot fields (Welford's algorithm)
+class RunningStatistics:
+    def __init__(self, fields=("price", "loanable_funds", "borrower_demand", "repayment_vs_demand", "aggregate_savings", "aggregate_debt")):
+        self.fields = list(fields)
+        self.count = 0
+        self.mean = {}
+        self.m2 = {}
+        self.min = {}
+        self.max = {}
+
+    def update(self, snapshot):
+        self.count += 1
+        for field in self.fields:
+            value = np.asarray(getattr(snapshot, field), dtype=float)
+            if self.count == 1:
+                self.mean[field] = value.copy()
+                self.m2[field] = np.zeros(value.shape)
+                self.min[field] = value.copy()
+                self.max[field] = value.copy()
+                continue
+            delta = value - self.mean[field]
+            self.mean[field] = self.mean[field] + delta / self.count
+            self.m2[field] = self.m2[field] + delta * (value - self.mean[field])
+            self.min[field] = np.minimum(self.min[field], value)
+            self.max[field] = np.maximum(self.max[field], value)
+        return snapshot
+
+    def variance(self, field):
+        return self.m2[field] / max(1, self.count - 1)
+
+# recorders are handed the simulation at the end of every round, before shocks are applied
+
+# human readable report of the capital market and every person
+class PrintRecorder:
+    def record(self, sim):
+        print("Capital Market: loanable_funds {0} borrower_demand {1}".format(sim.loanable_funds, sim.borrower_demand))
+        print("Capital Market: repayment_demand {0} repayment_supply {1}".format(sim.repayment_demand, sim.repayment_supply))
+        print("Equilibrium: borrowed_vs_desired {0}, savings_vs_desired {1}".format(sim.borrowed_vs_desired, sim.savings_vs_desired))
+        print("Equilibrium: repayment_vs_demand {0}".format(sim.repayment_vs_demand))
+        sim.report()
+
+RECORDED_COLUMNS = ["income", "borrowed_income", "consumed_income", "saved_income", "savings", "debt"]
+
+# per round, per person state in a binary columnar layout
+#
+# every column is a raw little endian float64 file <path>/<column>.bin with one row per recorded round,
+# rows are copied into preallocated buffers and appended to the files every chunk_rounds recorded rounds.
+# columns.json describes the row shape and row count, load_recording() maps the files back as arrays.
+# every_round and every_person keep only every k-th round and every k-th person of each scenario
+class ColumnarRecorder:
+    def __init__(self, path, columns=RECORDED_COLUMNS, every_round=1, every_person=1, chunk_rounds=256):
+        self.path = path
+        self.columns = list(columns)
+        self.every_round = every_round
+        self.every_person = every_person
+        self.chunk_rounds = chunk_rounds
+        self.buffers = None
+        self.rounds = np.zeros(chunk_rounds, dtype=np.int64)
+        self.buffered = 0
+        self.flushed = 0
+        self.files = {}
+        os.makedirs(path, exist_ok=True)
+
+    def record(self, sim):
+        if sim.round_index % self.every_round != 0:
+            return
+        if self.buffers is None:
+            row_shape = sim.column(self.columns[0])[..., ::self.every_person].shape
+            self.buffers = {name: np.zeros((self.chunk_rounds,) + row_shape, dtype="<f8") for name in self.columns}
+        for name in self.columns:
+            self.buffers[name][self.buffered] = sim.column(name)[..., ::self.every_person]
+        self.rounds[self.buffered] = sim.round_index
+        self.buffered += 1
+        if self.buffered == self.chunk_rounds:
+            self.flush()
+
+    def flush(self):
+        if self.buffers is None:
+            return
+        for name in ["round"] + self.columns:
+            if name not in self.files:
+                self.files[name] = open(os.path.join(self.path, name + ".bin"), "wb")
+            rows = self.rounds if name == "round" else self.buffers[name]
+            rows[:self.buffered].tofile(self.files[name])
+            self.files[name].flush()
+        self.flushed += self.buffered
+        self.buffered = 0
+        with open(os.path.join(self.path, "columns.json"), "w") as f:
+            json.dump({
+                "rows": self.flushed,
+                "row_shape": list(self.buffers[self.columns[0]].shape[1:]),
+                "columns": self.columns,
+                "every_round": self.every_round,
+                "every_person": self.every_person
+            }, f)
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+# read only memory maps of a ColumnarRecorder directory, the "round" column holds the round of each row
+def load_recording(path):
+    with open(os.path.join(path, "columns.json")) as f:
+        meta = json.load(f)
+    recording = {"round": np.memmap(os.path.join(path, "round.bin"), dtype=np.int64, mode="r", shape=(meta["rows"],))}
+    for name in meta["columns"]:
+        recording[name] = np.memmap(
+            os.path.join(path, name + ".bin"), dtype="<f8", mode="r", shape=tuple([meta["rows"]] + meta["row_shape"]))
+    return recording
+
+if __name__ == "__main__":
+    # nobody can borrow anymore after round 5
+    sim = Simulation(ShockSchedule().add("max_debt", 5, 0), PrintRecorder())
     sim.report()
-    if i == 5:
-        for p in sim.people:
-            p.max_debt = 0
+    for i in range(1, 10):
+        print("Round {0}".format(i))
+        sim.round()
 
 # I have to say something. Although I got most of the code correct on first try
 # There have been money leaks (not memory leaks), where money simply disappeared
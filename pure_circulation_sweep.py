@@ -0,0 +1,138 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+import pure_circulation
+
+# per round aggregates stored for every point of a sweep
+AGGREGATES = ["price", "loanable_funds", "borrower_demand", "repayment_vs_demand"]
+
+# cartesian grid over the Person(consumption_rate, max_saving, max_debt) parameters of an economy
+# every axis is a list of values, a value is either one number for everybody or one number per person
+class ParameterGrid:
+    def __init__(self, people, consumption_rate, max_saving, max_debt, productivity=1):
+        self.people = people
+        self.axes = []
+        for axis in (consumption_rate, max_saving, max_debt):
+            axis = np.asarray(axis, dtype=float)
+            if axis.ndim == 1:
+                axis = axis[:, None]
+            self.axes.append(np.broadcast_to(axis, (len(axis), people)))
+        self.productivity = np.broadcast_to(np.asarray(productivity, dtype=float), (people,))
+        self.shape = tuple(len(axis) for axis in self.axes)
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    # parameter arrays of shape (stop - start, people) for a contiguous range of grid points
+    def scenarios(self, start, stop):
+        index = np.unravel_index(np.arange(start, stop), self.shape)
+        return [axis[i] for axis, i in zip(self.axes, index)]
+
+# runs every point of a grid for a fixed number of rounds on a pool of worker processes
+#
+# results live in a file backed memory map of shape (points, rounds, aggregates) which every worker
+# maps and writes into directly, workers only send back the index of the chunk they finished.
+# finished chunks are recorded next to the results, so an interrupted sweep picks up where it stopped.
+# a fingerprint of the grid, rounds, chunks and shocks is stored with them, results of any other sweep are refused.
+# shocks of a single scenario refer to grid points
+class Sweep:
+    def __init__(self, grid, rounds, path, chunk_size=4096, shocks=None):
+        self.grid = grid
+        self.rounds = rounds
+        self.results_path = path + ".npy"
+        self.done_path = path + ".done.npy"
+        self.fingerprint_path = path + ".fingerprint"
+        self.chunk_size = chunk_size
+        self.shocks = shocks or pure_circulation.ShockSchedule()
+        self.chunks = (len(grid) + chunk_size - 1) // chunk_size
+
+    def fingerprint(self):
+        digest = hashlib.sha256()
+        for array in self.grid.axes + [self.grid.productivity]:
+            digest.update(repr(array.shape).encode())
+            digest.update(np.ascontiguousarray(array, dtype="<f8").tobytes())
+        digest.update(json.dumps([self.rounds, self.chunk_size, self.shocks.to_dict()], sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def open_results(self):
+        shape = (len(self.grid), self.rounds, len(AGGREGATES))
+        fingerprint = self.fingerprint()
+        if os.path.exists(self.results_path) and os.path.exists(self.done_path):
+            stored = None
+            if os.path.exists(self.fingerprint_path):
+                with open(self.fingerprint_path) as f:
+                    stored = f.read().strip()
+            if stored != fingerprint:
+                raise ValueError("{0} belongs to a different sweep".format(self.results_path))
+            results = np.load(self.results_path, mmap_mode="r+")
+            done = np.load(self.done_path, mmap_mode="r+")
+            if results.shape != shape or done.shape != (self.chunks,):
+                raise ValueError("{0} belongs to a sweep of a different shape {1}".format(self.results_path, results.shape))
+            return results, done
+        results = np.lib.format.open_memmap(self.results_path, mode="w+", dtype=float, shape=shape)
+        results[...] = np.nan
+        results.flush()
+        done = np.lib.format.open_memmap(self.done_path, mode="w+", dtype=bool, shape=(self.chunks,))
+        done.flush()
+        with open(self.fingerprint_path, "w") as f:
+            f.write(fingerprint)
+        return results, done
+
+    def pending(self):
+        _, done = self.open_results()
+        return [chunk for chunk in range(self.chunks) if not done[chunk]]
+
+    def run(self, processes=None):
+        results, done = self.open_results()
+        pending = [chunk for chunk in range(self.chunks) if not done[chunk]]
+        if pending:
+            with multiprocessing.Pool(processes, initializer=init_worker, initargs=(self,)) as pool:
+                for chunk in pool.imap_unordered(run_chunk, pending):
+                    done[chunk] = True
+                    done.flush()
+        return results
+
+    def run_chunk(self, chunk, results):
+        start = chunk * self.chunk_size
+        stop = min(start + self.chunk_size, len(self.grid))
+        consumption_rate, max_saving, max_debt = self.grid.scenarios(start, stop)
+        sim = pure_circulation.VectorizedSimulation(
+            consumption_rate, max_saving, max_debt, self.grid.productivity, shocks=self.shocks.scenario_range(start, stop))
+        for i in range(self.rounds):
+            sim.round()
+            for j, name in enumerate(AGGREGATES):
+                results[start:stop, i, j] = getattr(sim, name)
+        results.flush()
+
+# state of a worker process, the sweep is sent once per worker and the results are mapped once
+worker_sweep = None
+worker_results = None
+
+def init_worker(sweep):
+    global worker_sweep, worker_results
+    worker_sweep = sweep
+    worker_results = np.load(sweep.results_path, mmap_mode="r+")
+
+def run_chunk(chunk):
+    worker_sweep.run_chunk(chunk, worker_results)
+    return chunk
+
+if __name__ == "__main__":
+    # the economy of pure_circulation.Simulation with a saver and two borrowers
+    grid = ParameterGrid(
+        3,
+        consumption_rate=np.linspace(0.5, 0.9, 41),
+        max_saving=[(saving, 0, 0) for saving in np.linspace(0, 120, 49)],
+        max_debt=[(0, debt, debt) for debt in np.linspace(0, 100, 51)])
+    # nobody can borrow anymore after round 5
+    shocks = pure_circulation.ShockSchedule().add("max_debt", 5, 0)
+    sweep = Sweep(grid, 10, sys.argv[1] if len(sys.argv) > 1 else "circulation_sweep", shocks=shocks)
+    print("Sweep: {0} points, {1} of {2} chunks left".format(len(grid), len(sweep.pending()), sweep.chunks))
+    results = sweep.run()
+    final_price = results[:, -1, AGGREGATES.index("price")]
+    print("Final price: min {0}, max {1}".format(final_price.min(), final_price.max()))
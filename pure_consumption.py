@@ -1,10 +1,15 @@
+import collections
+import heapq
 import itertools
 import math
+import sys
+
+import numpy as np
 
 class Product:
-    def __init__(self, type):
+    def __init__(self, type, amount=0):
         self.type = type
-        self.amount = 0
+        self.amount = amount
 
 class ConsumptionBehavior:
     def __init__(self, daily_water, daily_food):
@@ -29,50 +34,380 @@ class ConsumptionBehavior:
            return self.daily_food
         return 0
 
+# inventories, productivity, health, cash and working hours of many agents in flat arrays, one row per agent
+#
+# good types are interned to column numbers the first time they show up, so consumption and trading work on
+# whole columns instead of a dict of Product objects per agent. rows and columns grow by doubling their capacity
+class AgentTable:
+    def __init__(self, goods=("WATER", "FOOD"), capacity=16):
+        self.good_ids = {}
+        self.good_types = []
+        self.size = 0
+        self.inventory_rows = np.zeros((capacity, len(goods)))
+        # output per hour of every good
+        self.productivity_rows = np.zeros((capacity, len(goods)))
+        self.health_rows = np.zeros(capacity)
+        self.cash_rows = np.zeros(capacity)
+        self.hours_rows = np.zeros(capacity)
+        for good_type in goods:
+            self.good_id(good_type)
+
+    # agents x goods, columns in the order of good_types
+    @property
+    def inventory(self):
+        return self.inventory_rows[:self.size, :len(self.good_types)]
+
+    @property
+    def productivity(self):
+        return self.productivity_rows[:self.size, :len(self.good_types)]
+
+    @property
+    def health(self):
+        return self.health_rows[:self.size]
+
+    @property
+    def cash(self):
+        return self.cash_rows[:self.size]
+
+    @property
+    def hours(self):
+        return self.hours_rows[:self.size]
+
+    def good_id(self, good_type):
+        if good_type not in self.good_ids:
+            if len(self.good_types) == self.inventory_rows.shape[1]:
+                self.inventory_rows = np.hstack([self.inventory_rows, np.zeros_like(self.inventory_rows)])
+                self.productivity_rows = np.hstack([self.productivity_rows, np.zeros_like(self.productivity_rows)])
+            self.good_ids[good_type] = len(self.good_types)
+            self.good_types.append(good_type)
+        return self.good_ids[good_type]
+
+    # rows of count new agents
+    def add_agents(self, count):
+        while self.size + count > len(self.health_rows):
+            for name in ("inventory_rows", "productivity_rows", "health_rows", "cash_rows", "hours_rows"):
+                rows = getattr(self, name)
+                setattr(self, name, np.concatenate([rows, np.zeros_like(rows)]))
+        self.size += count
+        return range(self.size - count, self.size)
+
+    def add_agent(self):
+        return self.add_agents(1)[0]
+
+    # ConsumptionBehavior.consume for every agent, desired is agents x goods in the columns of good_ids
+    def consume(self, good_ids, desired):
+        health = self.health
+        for column, good in enumerate(good_ids):
+            stock = self.inventory_rows[:self.size, good]
+            has = stock >= desired[:, column]
+            stock -= np.where(has, desired[:, column], 0)
+            # dehydrating or starving
+            health[:] = np.where(has, np.minimum(20, health + 1), health - 1)
+
+# the inventory of one agent, a view of its row in an AgentTable
 class Inventory:
-    def __init__(self, goods):
-        self.goods_by_type = {}
+    __slots__ = ("table", "agent")
+
+    def __init__(self, goods, table=None, agent=None):
+        if table is None:
+            table = AgentTable()
+            agent = table.add_agent()
+        self.table = table
+        self.agent = agent
         for good in goods:
             self.add(good)
 
     def add(self, good):
-        if good.type in self.goods_by_type:
-            self.goods_by_type[good.type].amount += good.amount
-        else:
-            self.goods_by_type[good.type] = good
+        self.table.inventory_rows[self.agent, self.table.good_id(good.type)] += good.amount
 
     def has(self, good_type, amount):
-        return good_type in self.goods_by_type and self.goods_by_type[good_type].amount >= amount
+        return good_type in self.table.good_ids and self.amount(good_type) >= amount
 
     def amount(self, good_type):
-        if good_type in self.goods_by_type:
-            return self.goods_by_type[good_type].amount
+        if good_type in self.table.good_ids:
+            return self.table.inventory_rows[self.agent, self.table.good_ids[good_type]]
         return 0
 
     def remove(self, good_type, amount):
-        if good_type in self.goods_by_type:
-            self.goods_by_type[good_type].amount = max(0, self.goods_by_type[good_type].amount - amount)
+        if good_type in self.table.good_ids:
+            good = self.table.good_ids[good_type]
+            self.table.inventory_rows[self.agent, good] = max(0, self.table.inventory_rows[self.agent, good] - amount)
+
+# a person attribute that is stored in the row of the person in its AgentTable
+def table_column(name):
+    def get(person):
+        return getattr(person.inventory.table, name)[person.inventory.agent]
 
+    def set(person, value):
+        getattr(person.inventory.table, name)[person.inventory.agent] = value
+
+    return property(get, set)
+
+# people of one simulation share an AgentTable, a person on its own gets a table of its own
 class Person:
-    def __init__(self, tp):
+    health = table_column("health_rows")
+    cash = table_column("cash_rows")
+    hoursPerDay = table_column("hours_rows")
+
+    def __init__(self, tp, table=None):
+        if table is None:
+            table = AgentTable()
+        self.inventory = Inventory([
+            Product("WATER", 10),
+            Product("FOOD", 10)
+        ], table, table.add_agent())
         self.productivityMultiplier = 1
         self.hoursPerDay = 8
         self.cash = 10
-        self.inventory = [
-            Product("WATER", 10),
-            Product("FOOD", 10)
-        ]
         self.health = 100
         self.time_preference = tp
         self.consumption_behavior = ConsumptionBehavior(3, 3)
+        # offers of this person that are still in the order books, by good type
+        self.offers = {}
+
+    # the same productivity for every good, the table can also hold a different one per good
+    @property
+    def productivityMultiplier(self):
+        return self.inventory.table.productivity_rows[self.inventory.agent, 0]
+
+    @productivityMultiplier.setter
+    def productivityMultiplier(self, productivity):
+        self.inventory.table.productivity_rows[self.inventory.agent] = productivity
+
+BUY = "BUY"
+SELL = "SELL"
 
+# quantity is what is left to fill, an offer stays active until it is filled or cancelled
 class MarketOffer:
-    def __init__(self, person, good_type, quantity, price):
+    def __init__(self, person, good_type, quantity, price, side):
         self.person = person
         self.good_type = good_type
         self.quantity = quantity
         self.price = price
-
+        self.side = side
+        self.active = True
+
+Fill = collections.namedtuple("Fill", ["buy_offer", "sell_offer", "quantity", "price"])
+
+# continuous double auction for one good
+#
+# bids and asks sit in heaps ordered by price and then by arrival (price-time priority). a new offer is matched
+# against the best offers on the other side until it is filled or the prices stop crossing, whatever is left of it
+# rests in the book. cancelled offers are only marked and dropped once they reach the top of their heap, so placing
+# and cancelling both cost O(log n). the book outlives a trading round, offers nobody touches keep their place
+class OrderBook:
+    def __init__(self, good_type):
+        self.good_type = good_type
+        # (-price, sequence, offer), the highest bid first
+        self.bids = []
+        # (price, sequence, offer), the lowest ask first
+        self.asks = []
+        self.sequence = itertools.count()
+        self.cancelled = 0
+
+    def __len__(self):
+        return len(self.bids) + len(self.asks) - self.cancelled
+
+    # best offer on one side, dropping the cancelled offers on top of the heap
+    def best(self, heap):
+        while heap and not heap[0][2].active:
+            heapq.heappop(heap)
+            self.cancelled -= 1
+        return heap[0][2] if heap else None
+
+    def best_bid(self):
+        return self.best(self.bids)
+
+    def best_ask(self):
+        return self.best(self.asks)
+
+    # matches the offer and returns the fills, a fill is priced halfway between the bid and the ask
+    def place(self, offer):
+        fills = []
+        if offer.side == BUY:
+            opposite, crosses = self.asks, lambda best: best.price <= offer.price
+        else:
+            opposite, crosses = self.bids, lambda best: best.price >= offer.price
+        while offer.quantity > 0:
+            best = self.best(opposite)
+            if best is None or not crosses(best):
+                break
+            amount = min(offer.quantity, best.quantity)
+            offer.quantity -= amount
+            best.quantity -= amount
+            buy_offer, sell_offer = (offer, best) if offer.side == BUY else (best, offer)
+            fills.append(Fill(buy_offer, sell_offer, amount, (buy_offer.price + sell_offer.price) / 2))
+            if best.quantity <= 0:
+                best.active = False
+                heapq.heappop(opposite)
+        if offer.quantity > 0:
+            if offer.side == BUY:
+                heapq.heappush(self.bids, (-offer.price, next(self.sequence), offer))
+            else:
+                heapq.heappush(self.asks, (offer.price, next(self.sequence), offer))
+        else:
+            offer.active = False
+        return fills
+
+    def cancel(self, offer):
+        if offer.active:
+            offer.active = False
+            self.cancelled += 1
+            # a book full of cancelled offers is rebuilt, so the heaps never grow far beyond the live offers
+            if self.cancelled > len(self.bids) + len(self.asks) - self.cancelled:
+                self.bids = [entry for entry in self.bids if entry[2].active]
+                self.asks = [entry for entry in self.asks if entry[2].active]
+                heapq.heapify(self.bids)
+                heapq.heapify(self.asks)
+                self.cancelled = 0
+
+
+AuctionResult = collections.namedtuple("AuctionResult", ["prices", "volumes", "bid_fills", "ask_fills"])
+
+# uniform price call auction for several goods at once, every argument is a (goods, offers) array and offers
+# with quantity 0 are padding
+#
+# bids and asks of a good are sorted by price together. the cumulative supply at the last offer of every price
+# counts all asks at or below the price and the cumulative demand at its first offer all bids at or above it,
+# every offer of the price takes both from there. the largest volume goes first, ties in volume go to the price with
+# the smallest imbalance and then to the lowest price. the long side is rationed pro rata among the offers that
+# accept the clearing price, goods without crossing offers get a nan price
+def call_auction(bid_prices, bid_quantities, ask_prices, ask_quantities):
+    bid_quantities = np.asarray(bid_quantities, dtype=float)
+    ask_quantities = np.asarray(ask_quantities, dtype=float)
+    bid_prices = np.broadcast_to(np.asarray(bid_prices, dtype=float), bid_quantities.shape)
+    ask_prices = np.broadcast_to(np.asarray(ask_prices, dtype=float), ask_quantities.shape)
+    prices = np.concatenate([ask_prices, bid_prices], axis=1)
+    # offers of the same price end up next to each other
+    order = np.argsort(prices, axis=1)
+    prices = np.take_along_axis(prices, order, axis=1)
+    asks = np.take_along_axis(np.concatenate([ask_quantities, np.zeros_like(bid_quantities)], axis=1), order, axis=1)
+    bids = np.take_along_axis(np.concatenate([np.zeros_like(ask_quantities), bid_quantities], axis=1), order, axis=1)
+    supply = np.cumsum(asks, axis=1)
+    demand = np.cumsum(bids[:, ::-1], axis=1)[:, ::-1]
+    # exact supply and demand of every position come from the last ask and the first bid of its price
+    positions = np.broadcast_to(np.arange(prices.shape[1]), prices.shape)
+    new_price = np.ones(prices.shape, dtype=bool)
+    new_price[:, 1:] = prices[:, 1:] != prices[:, :-1]
+    first = np.maximum.accumulate(np.where(new_price, positions, 0), axis=1)
+    last_price = np.ones(prices.shape, dtype=bool)
+    last_price[:, :-1] = new_price[:, 1:]
+    last = np.minimum.accumulate(np.where(last_price, positions, prices.shape[1])[:, ::-1], axis=1)[:, ::-1]
+    supply = np.take_along_axis(supply, last, axis=1)
+    demand = np.take_along_axis(demand, first, axis=1)
+    volume = np.where(asks + bids > 0, np.minimum(supply, demand), -1)
+    volumes = np.maximum(volume.max(axis=1, initial=-1), 0)
+    imbalance = np.where(volume == volumes[:, None], np.abs(supply - demand), np.inf)
+    best = np.argmin(imbalance, axis=1)
+    clearing = np.where(volumes > 0, prices[np.arange(len(prices)), best], np.nan)
+
+    with np.errstate(invalid="ignore"):
+        bidders = bid_quantities * (bid_prices >= clearing[:, None])
+        askers = ask_quantities * (ask_prices <= clearing[:, None])
+    bid_total = bidders.sum(axis=1)
+    ask_total = askers.sum(axis=1)
+    bid_ratio = np.divide(volumes, bid_total, out=np.zeros_like(volumes), where=bid_total > 0)
+    ask_ratio = np.divide(volumes, ask_total, out=np.zeros_like(volumes), where=ask_total > 0)
+    return AuctionResult(clearing, volumes, bidders * bid_ratio[:, None], askers * ask_ratio[:, None])
+
+# demand of every agent (agents x goods) when they spend shares[k, g] of their wealth on good g and keep the rest
+# of it as cash, wealth is cash plus the inventory at market prices (Cobb-Douglas)
+def budget_demand(prices, cash, inventory, shares):
+    wealth = cash + inventory @ prices
+    return shares * wealth[:, None] / prices
+
+TatonnementResult = collections.namedtuple("TatonnementResult", ["prices", "excess_demand", "iterations", "converged"])
+
+# walrasian price adjustment, excess_demand maps a price vector to the excess demand of every good
+#
+# every iteration moves the prices by a multiplicative step against the excess demand relative to the supply,
+# so prices stay positive and goods of any volume move at the same pace. the step of a good grows while its
+# excess demand keeps its sign and shrinks once it flips, which means the price went past the clearing price.
+# the search stops when no relative excess demand is above the tolerance, goods without supply keep their price
+def tatonnement(excess_demand, prices, supply, step=0.5, tolerance=1e-6, max_iterations=200, grow=1.2, shrink=0.5, max_step=2):
+    prices = np.array(prices, dtype=float)
+    supply = np.asarray(supply, dtype=float)
+    steps = np.full(prices.shape, float(step))
+    previous = np.zeros(prices.shape)
+    for iteration in range(1, max_iterations + 1):
+        excess = excess_demand(prices)
+        relative = np.divide(excess, supply, out=np.zeros(prices.shape), where=supply > 0)
+        if np.abs(relative).max(initial=0) <= tolerance:
+            return TatonnementResult(prices, excess, iteration, True)
+        steps = np.where(relative * previous < 0, steps * shrink, np.minimum(steps * grow, max_step))
+        previous = relative
+        prices = prices * np.exp(steps * np.clip(relative, -1, 1))
+    return TatonnementResult(prices, excess_demand(prices), max_iterations, False)
+
+Allocation = collections.namedtuple("Allocation", ["goods", "cash", "multiplier"])
+
+# utility based consumption allocation with a limited budget for every agent at once
+#
+# the utility of a good is urgency * desired * log(1 + quantity / desired), where the urgency max_health / health
+# grows as health falls, and the utility of the cash kept is cash_weight * log(1 + cash). at the optimum every good
+# that is bought and the cash kept have the same marginal utility per dollar, the multiplier lambda, which fixes
+# the quantities. spending falls as lambda grows, so lambda is found by bisection on a log scale, every numpy pass
+# halves the bracket of all agents at once
+def allocate_budget(health, cash, prices, desired, cash_weight=1.0, max_health=20, iterations=40):
+    desired = np.asarray(desired, dtype=float)
+    budget = np.maximum(np.asarray(cash, dtype=float), 0)
+    prices = np.broadcast_to(np.asarray(prices, dtype=float), desired.shape)
+    weights = (max_health / np.maximum(np.asarray(health, dtype=float), 1))[:, None] * desired
+    scales = np.where(desired > 0, desired, 1)
+
+    # the spending on a good is max(weights / lambda - scales * prices, 0), the bisection runs on 1 / lambda.
+    # goods x agents copies keep the sum over goods a sum of contiguous rows
+    costs = np.ascontiguousarray((scales * prices).T)
+    weights = np.ascontiguousarray(weights.T)
+    # the kept cash alone spends the whole budget at over_budget, nothing is bought at within_budget
+    over_budget = (budget + 1) / cash_weight
+    within_budget = 1 / np.maximum((weights / costs).max(axis=0, initial=0), cash_weight)
+    for _ in range(iterations):
+        middle = np.sqrt(over_budget * within_budget)
+        spending = np.maximum(weights * middle - costs, 0).sum(axis=0) + np.maximum(cash_weight * middle - 1, 0)
+        over = spending > budget
+        np.copyto(over_budget, middle, where=over)
+        np.copyto(within_budget, middle, where=~over)
+    goods = (np.maximum(weights * within_budget - costs, 0)).T / prices
+    return Allocation(goods, budget - (goods * prices).sum(axis=1), 1 / within_budget)
+
+# decides the working hours of every agent per good
+#
+# agents work to cover what their desired consumption costs beyond their cash and inventory, excess cash and
+# products reduce the need for production in this period. all hours go to the good that earns the most per hour
+# at current prices. these coefficients are cached and only computed again once a price moved by more than
+# threshold (relative) since they were computed, or the number of agents changed. call invalidate after changing
+# productivity
+class ProductionPlanner:
+    def __init__(self, threshold=0.05):
+        self.threshold = threshold
+        self.prices = None
+        self.best_good = None
+        self.best_rate = None
+        self.updates = 0
+
+    def invalidate(self):
+        self.prices = None
+
+    # (column of the best good in good_ids, revenue per hour) of every agent
+    def coefficients(self, table, good_ids, prices):
+        if (self.prices is None or len(self.best_good) != table.size
+                or np.abs(prices / self.prices - 1).max() > self.threshold):
+            rates = table.productivity[:, good_ids] * prices
+            self.best_good = rates.argmax(axis=1)
+            self.best_rate = rates[np.arange(len(rates)), self.best_good]
+            self.prices = prices.copy()
+            self.updates += 1
+        return self.best_good, self.best_rate
+
+    # hours of every agent (agents x goods), desired is agents x goods in the columns of good_ids
+    def plan(self, table, good_ids, desired, prices):
+        best_good, best_rate = self.coefficients(table, good_ids, prices)
+        needed = desired @ prices - table.inventory[:, good_ids] @ prices - table.cash
+        hours = np.zeros(desired.shape)
+        hours[np.arange(len(hours)), best_good] = np.clip(
+            np.divide(needed, best_rate, out=np.zeros_like(needed), where=best_rate > 0), 0, table.hours)
+        return hours
 
 def utility_function_water(person, quantity):
     if quantity < 3:
@@ -89,85 +424,75 @@ def utility_function_food(person, quantity):
     x = person.health
     return 0.5 - (b/2)/(x-c)
 
+# market is "order_book" for continuous matching of every offer, "auction" for one call auction per round or
+# "tatonnement" for trading at market clearing prices, spending_share is the part of their wealth people spend on
+# goods in the tatonnement market
 class Simulation:
-    def __init__(self):
-        self.people = [
-            Person(0.10),
-            Person(0.05),
-            Person(0.07),
-            Person(0.08),
-            Person(0.02),
-            Person(0.01),
-            Person(0.07),
-            Person(0.01),
-            Person(0.04),
-            Person(0.20)
-        ]
+    def __init__(self, market="order_book", spending_share=0.5):
+        self.table = AgentTable()
+        self.people = [Person(tp, self.table) for tp in [0.10, 0.05, 0.07, 0.08, 0.02, 0.01, 0.07, 0.01, 0.04, 0.20]]
+        # consumption behaviors do not change during a simulation, row k belongs to people[k]
+        self.goods = ["WATER", "FOOD"]
+        self.good_ids = [self.table.good_id(good) for good in self.goods]
+        self.desired = np.array(
+            [[person.consumption_behavior.desired(good) for good in self.goods] for person in self.people], dtype=float)
         self.prices = {"WATER": 1, "FOOD": 1}
+        self.market = market
+        self.spending_share = spending_share
+        self.order_books = {good: OrderBook(good) for good in self.prices}
+        self.planner = ProductionPlanner()
 
     def produce(self):
-        price = 1
-        for person in self.people:
-            goods = ["WATER", "FOOD"]
-            predicted_cash = 0
-
-            # todo implement utility based consumption allocation function with limited budget
-            for good in goods:
-                predicted_cash += person.consumption_behavior.desired(good) * self.prices[good]
-
-            # todo implement production allocation function
-
-            # excess cash and products reduce the need for production in this period
-            max_production = ((predicted_cash - person.cash) / price) - person.products
-            max_hours = min(person.hoursPerDay, max_production / person.productivityMultiplier)
-            person.products += person.productivityMultiplier * max_hours
+        prices = np.array([self.prices[good] for good in self.goods], dtype=float)
+        hours = self.planner.plan(self.table, self.good_ids, self.desired, prices)
+        self.table.inventory[:, self.good_ids] += self.table.productivity[:, self.good_ids] * hours
 
     def trade(self):
+        if self.market == "auction":
+            self.trade_auction()
+            return
+        if self.market == "tatonnement":
+            self.trade_tatonnement()
+            return
+
         # simulate market for each good individually
         goods = ["WATER", "FOOD"]
+        affordable = self.consumption_plan().goods
 
-        for good in goods:
-            sell_offers = []
-            buy_offers = []
+        for g, good in enumerate(goods):
+            book = self.order_books[good]
+            price = self.prices[good]
 
-            for person in self.people:
-                price = 1
-                # TODO adjust consumption to stay within the budget
+            # everyone checks their resting offer against this round's inventory and budget before anyone trades,
+            # so no offer is filled for more than its owner can sell or pay
+            new_offers = []
+            for k, person in enumerate(self.people):
                 difference = person.inventory.amount(good) - person.consumption_behavior.desired(good)
-                if difference > 0:
-                    # sell excess product
-                    sell_offers.add(MarketOffer(person, good, difference, price))
-                if difference < 0:
-                    # buy shortage product
-                    buy_offers.add(MarketOffer(person, good, -difference, price))
-
-            # total_supply = sum([offer.quantity for offer in sell_offers])
-            # total_demand = sum([offer.quantity for offer in buy_offers])
-            # net_balance = total_supply - total_demand
-
-            buy_offers_asc = buy_offers.sort(key=lambda x: x.price, reverse=True)
-            sell_offers_desc = sell_offers.sort(key=lambda x: x.price)
-
-            i = 0
-            j = 0
-
-            while buy_offers_asc and sell_offers_desc:
-                b_offer = buy_offers_asc[i]
-                s_offer = sell_offers_desc[j]
-                if b_offer.price >= s_offer.price:
-                    amount = min(b_offer.quantity, s_offer)
-                    b_offer.quantity -= amount
-                    s_offer.quantity -= amount
-                    fair_price = (b_offer.price + s_offer.price)/2
-                    b_offer.person.cash -= fair_price * amount
-                    s_offer.person.cash += fair_price * amount
-
-                    if b_offer.quantity <= 0:
-                        i += 1
-                    if s_offer.quantity <= 0:
-                        j += 1
-                else:
-                    break
+                # buy no more than the budget allows
+                difference = max(difference, -affordable[k, g])
+                # sell excess product or buy shortage product
+                side = SELL if difference > 0 else BUY
+                offer = person.offers.pop(good, None)
+                if offer is not None and offer.active:
+                    if offer.side == side and offer.quantity == abs(difference) and offer.price == price:
+                        # unchanged offers keep their place in the book
+                        person.offers[good] = offer
+                        continue
+                    book.cancel(offer)
+                if difference != 0:
+                    new_offers.append(MarketOffer(person, good, abs(difference), price, side))
+
+            for offer in new_offers:
+                for fill in book.place(offer):
+                    buyer = fill.buy_offer.person
+                    seller = fill.sell_offer.person
+                    buyer.cash -= fill.price * fill.quantity
+                    seller.cash += fill.price * fill.quantity
+                    seller.inventory.remove(good, fill.quantity)
+                    buyer.inventory.add(Product(good, fill.quantity))
+                if offer.active:
+                    offer.person.offers[good] = offer
+
         # repeat pricing rounds
 
 
@@ -178,19 +503,67 @@ class Simulation:
         # should be twice as valuable
         # or in other words, the marginal utility of any marginal dollar should be identical across products
 
-        # there are no prices yet, because clearing the market
-        # has not been implemented yet
-        # all we did was generate buy and sell offers
+        # the order books match offers at the prices people ask for
+        # but nobody chooses a price yet, every offer uses the fixed price of its good
         # depending on whether there is not enough food or water,
         # one of them will be more valuable than the other
 
         # te
 
+    # the bundle every person would buy with their cash at the current prices, rows follow people
+    def consumption_plan(self):
+        prices = np.array([self.prices[good] for good in self.goods], dtype=float)
+        return allocate_budget(self.table.health, self.table.cash, prices, self.desired)
+
+    # all goods clear at once at a uniform price per good
+    def trade_auction(self):
+        # buy no more than the budget allows
+        difference = np.maximum(self.table.inventory[:, self.good_ids] - self.desired, -self.consumption_plan().goods).T
+        prices = np.array([[self.prices[good]] for good in self.goods], dtype=float)
+        result = call_auction(prices, np.maximum(-difference, 0), prices, np.maximum(difference, 0))
+        payments = (np.nan_to_num(result.prices)[:, None] * (result.bid_fills - result.ask_fills)).sum(axis=0)
+        self.table.inventory[:, self.good_ids] += (result.bid_fills - result.ask_fills).T
+        self.table.cash[:] -= payments
+
+    # prices are searched until the market clears, then everyone trades to their demand at those prices
+    # the long side of every good is scaled down to the short side, so goods and cash add up exactly
+    def trade_tatonnement(self):
+        cash = self.table.cash
+        inventory = self.table.inventory[:, self.good_ids]
+        total_desired = self.desired.sum(axis=1, keepdims=True)
+        shares = self.spending_share * np.divide(
+            self.desired, total_desired, out=np.zeros_like(self.desired), where=total_desired > 0)
+        result = tatonnement(
+            lambda prices: (budget_demand(prices, cash, inventory, shares) - inventory).sum(axis=0),
+            [self.prices[good] for good in self.goods], inventory.sum(axis=0))
+        self.prices = dict(zip(self.goods, result.prices.tolist()))
+
+        trades = budget_demand(result.prices, cash, inventory, shares) - inventory
+        buys = np.maximum(trades, 0)
+        sells = np.maximum(-trades, 0)
+        volume = np.minimum(buys.sum(axis=0), sells.sum(axis=0))
+        buys *= np.divide(volume, buys.sum(axis=0), out=np.zeros_like(volume), where=volume > 0)
+        sells *= np.divide(volume, sells.sum(axis=0), out=np.zeros_like(volume), where=volume > 0)
+        self.table.inventory[:, self.good_ids] += buys - sells
+        self.table.cash[:] -= (buys - sells) @ result.prices
+
     def consumption(self):
-       for person in self.people:
-           person.consumption_behavior.consume(person)
+        self.table.consume(self.good_ids, self.desired)
 
     def round(self):
         self.produce()
         self.trade()
-        self.consumption()
\ No newline at end of file
+        self.consumption()
+
+if __name__ == "__main__":
+    sim = Simulation(sys.argv[1] if len(sys.argv) > 1 else "order_book")
+    for i in range(6):
+        sim.round()
+        print("Round {0}: water {1}, food {2}, cash {3}, health {4}, open offers {5}, prices {6}".format(
+            i,
+            sum(person.inventory.amount("WATER") for person in sim.people),
+            sum(person.inventory.amount("FOOD") for person in sim.people),
+            sum(person.cash for person in sim.people),
+            sum(person.health for person in sim.people) / len(sim.people),
+            {good: len(book) for good, book in sim.order_books.items()},
+            {good: round(price, 3) for good, price in sim.prices.items()}))
@@ -1,5 +1,6 @@
 from __future__ import print_function
 from optlang import Model, Variable, Constraint, Objective
+from optlang.symbolics import Zero
 
 # this is essentially a discrete neoclassical model
 # we have three agents
@@ -16,105 +17,116 @@ from optlang import Model, Variable, Constraint, Objective
 # purchases_i = \sum_{j=0\land j \neq i}^{n} p_i * t_j_i
 # \sum_{j=0\land j \neq i}^{n} p_i * t_i_j = \sum_{j=0\land j \neq i}^{n} p_i * t_j_i
 
-# Transaction variables where t_i_j stands for i selling x amount to j
-
-# actors cannot buy their own products so t_i_i is not necessary
-
-#t_1_1 = Variable('t_1_1', lb=0, type='integer')
-t_1_2 = Variable('t_1_2', lb=0, type='integer')
-t_1_3 = Variable('t_1_3', lb=0, type='integer')
-
-t_2_1 = Variable('t_2_1', lb=0, type='integer')
-#t_2_2 = Variable('t_2_2', lb=0, type='integer')
-t_2_3 = Variable('t_2_3', lb=0, type='integer')
-
-t_3_1 = Variable('t_3_1', lb=0, type='integer')
-t_3_2 = Variable('t_3_2', lb=0, type='integer')
-#t_3_3 = Variable('t_3_3', lb=0, type='integer')
-
-# production variables for each actor
-
-prod_1_1_1 = Variable('prod_1_1_1', lb=0, type='integer')
-prod_1_2_1 = Variable('prod_1_2_1', lb=0, type='integer')
-prod_1_3_1 = Variable('prod_1_3_1', lb=0, type='integer')
-prod_1_1_2 = Variable('prod_1_1_2', lb=0, type='integer')
-prod_1_2_2 = Variable('prod_1_2_2', lb=0, type='integer')
-prod_1_3_2 = Variable('prod_1_3_2', lb=0, type='integer')
-
-prod_2_1_1 = Variable('prod_2_1_1', lb=0, type='integer')
-prod_2_2_1 = Variable('prod_2_2_1', lb=0, type='integer')
-prod_2_3_1 = Variable('prod_2_3_1', lb=0, type='integer')
-prod_2_1_2 = Variable('prod_2_1_2', lb=0, type='integer')
-prod_2_2_2 = Variable('prod_2_2_2', lb=0, type='integer')
-prod_2_3_2 = Variable('prod_2_3_2', lb=0, type='integer')
-
-prod_3_1_1 = Variable('prod_3_1_1', lb=0, type='integer')
-prod_3_2_1 = Variable('prod_3_2_1', lb=0, type='integer')
-prod_3_3_1 = Variable('prod_3_3_1', lb=0, type='integer')
-prod_3_1_2 = Variable('prod_3_1_2', lb=0, type='integer')
-prod_3_2_2 = Variable('prod_3_2_2', lb=0, type='integer')
-prod_3_3_2 = Variable('prod_3_3_2', lb=0, type='integer')
-
-# production with minimum batch sizes
-c_batch_prod_1_1 = Constraint(8 * prod_1_1_1 + 7 * prod_1_2_1 + 3 * prod_1_3_1 - t_1_2, lb=0, ub=0)
-c_batch_prod_1_2 = Constraint(8 * prod_1_1_2 + 7 * prod_1_2_2 + 3 * prod_1_3_2 - t_1_3, lb=0, ub=0)
-
-c_batch_prod_2_1 = Constraint(5 * prod_2_1_1 + 2 * prod_2_2_1 + 11 * prod_2_3_1 - t_2_1, lb=0, ub=0)
-c_batch_prod_2_2 = Constraint(5 * prod_2_1_2 + 2 * prod_2_2_2 + 11 * prod_2_3_2 - t_2_3, lb=0, ub=0)
-
-c_batch_prod_3_1 = Constraint(4 * prod_3_1_1 + 1 * prod_3_2_1 + 3 * prod_3_3_1 - t_3_1, lb=0, ub=0)
-c_batch_prod_3_2 = Constraint(4 * prod_3_1_2 + 1 * prod_3_2_2 + 3 * prod_3_3_2 - t_3_2, lb=0, ub=0)
-
-# production time constraint Z = 30
-c_time_prod_1 = Constraint(7 * prod_1_1_1 + 7 * prod_1_1_2 + 6 * prod_1_2_1 + 6 * prod_1_2_2 + 4 * prod_1_3_1 + 4 * prod_1_3_2, lb=0, ub=30)
-c_time_prod_2 = Constraint(5 * prod_2_1_1 + 5 * prod_2_1_2 + 3 * prod_2_2_1 + 3 * prod_2_2_2 + 7 * prod_2_3_1 + 7 * prod_2_3_2, lb=0, ub=30)
-c_time_prod_3 = Constraint(3 * prod_3_1_1 + 3 * prod_3_1_2 + 2 * prod_3_2_1 + 2 * prod_3_2_2 + 4 * prod_3_3_1 + 4 * prod_3_3_2, lb=0, ub=30)
-
-# global equilibrium constraint
-c_equilibrium_1 = Constraint(t_1_2 + t_1_3 - t_2_1 - t_3_1, lb=0, ub=0)
-c_equilibrium_2 = Constraint(t_2_1 + t_2_3 - t_1_2 - t_3_2, lb=0, ub=0)
-c_equilibrium_3 = Constraint(t_3_1 + t_3_2 - t_1_3 - t_2_3, lb=0, ub=0)
-
-# barter equilibrium constraint
-b_equilibrium_1_2 = Constraint(t_1_2 - t_2_1, lb=0, ub=0)
-b_equilibrium_1_3 = Constraint(t_1_3 - t_3_1, lb=0, ub=0)
-b_equilibrium_2_3 = Constraint(t_2_3 - t_3_2, lb=0, ub=0)
-
-# GDP maximization, aka all sales and all purchases
-obj = Objective(t_1_2 + t_1_3 + t_2_1 + t_2_3 + t_3_1 + t_3_2, direction='max')
-
-# Variables, constraints and objective are combined in a Model object, which can subsequently be optimized.
-model = Model(name='Simple model')
-model.objective = obj
-model.add([
-    c_batch_prod_1_1, c_batch_prod_2_1, c_batch_prod_3_1,
-    c_batch_prod_1_2, c_batch_prod_2_2, c_batch_prod_3_2,
-    c_time_prod_1, c_time_prod_2, c_time_prod_3
-])
-# model.add([c_equilibrium_1, c_equilibrium_2, c_equilibrium_3])
-model.add([b_equilibrium_1_2, b_equilibrium_1_3, b_equilibrium_2_3])
-
-status = model.optimize()
-
-print("----------")
-for var_name, var in model.variables.iteritems():
-    print(var_name, "=", var.primal)
-
-print("status:", model.status)
-
-print("Effective GDP:", model.objective.value)
-
-print("Actor 1 Sales: {0}, Purchases: {1}, Time spent: {2}".format(
-    t_1_2.primal + t_1_3.primal,
-    t_2_1.primal + t_3_1.primal,
-    c_time_prod_1.primal))
-
-print("Actor 2 Sales: {0}, Purchases: {1}, Time spent: {2}".format(
-    t_2_1.primal + t_2_3.primal,
-    t_1_2.primal + t_3_2.primal,
-    c_time_prod_2.primal))
-
-print("Actor 3 Sales: {0}, Purchases: {1}, Time spent: {2}".format(
-    t_3_1.primal + t_3_2.primal,
-    t_1_3.primal + t_2_3.primal,
-    c_time_prod_3.primal))
\ No newline at end of file
+# the model is a template: its structure is built once and the parameters
+# (batch sizes, production times and the time budget Z) are written into the constraints
+# as coefficients and bounds, so they can be swapped between solves without building expressions again
+class EquilibriumModel:
+    def __init__(self, agents=(1, 2, 3), productions=(1, 2, 3)):
+        self.agents = list(agents)
+        self.productions = list(productions)
+
+        # Transaction variables where t_i_j stands for i selling x amount to j
+
+        # actors cannot buy their own products so t_i_i is not necessary
+        self.t = {}
+        for i in self.agents:
+            for j in self.agents:
+                if i != j:
+                    self.t[i, j] = Variable('t_{0}_{1}'.format(i, j), lb=0, type='integer')
+
+        # buyers of every agent, prod_i_k_b is production k of agent i sold to its b-th buyer
+        self.buyers = {i: [j for j in self.agents if j != i] for i in self.agents}
+
+        # production variables for each actor
+        self.prod = {}
+        for b in range(1, len(self.agents)):
+            for i in self.agents:
+                for k in self.productions:
+                    self.prod[i, k, b] = Variable('prod_{0}_{1}_{2}'.format(i, k, b), lb=0, type='integer')
+
+        # constraints start out empty, set_parameters fills in their coefficients and bounds
+        # production with minimum batch sizes
+        self.c_batch_prod = {(i, b): Constraint(Zero, lb=0, ub=0) for i in self.agents for b in range(1, len(self.agents))}
+        # production time constraint
+        self.c_time_prod = {i: Constraint(Zero, lb=0) for i in self.agents}
+        # global equilibrium constraint
+        self.c_equilibrium = {i: Constraint(Zero) for i in self.agents}
+        # barter equilibrium constraint
+        self.b_equilibrium = {(i, j): Constraint(Zero) for i in self.agents for j in self.agents if i < j}
+
+        # GDP maximization, aka all sales and all purchases
+        self.model = Model(name='Simple model')
+        self.model.add(list(self.t.values()) + list(self.prod.values()))
+        self.model.add(list(self.c_batch_prod.values()) + list(self.c_time_prod.values()))
+        self.model.add(list(self.c_equilibrium.values()) + list(self.b_equilibrium.values()))
+        self.model.update()
+        self.model.objective = Objective(Zero, direction='max')
+        self.model.objective.set_linear_coefficients({var: 1 for var in self.t.values()})
+
+        for i in self.agents:
+            coefficients = {self.t[i, j]: 1 for j in self.buyers[i]}
+            coefficients.update({self.t[j, i]: -1 for j in self.buyers[i]})
+            self.c_equilibrium[i].set_linear_coefficients(coefficients)
+        for i, j in self.b_equilibrium:
+            self.b_equilibrium[i, j].set_linear_coefficients({self.t[i, j]: 1, self.t[j, i]: -1})
+        # the global equilibrium holds until set_equilibrium picks another one
+        self.set_equilibrium("global")
+
+    # batch_size[i][k] and time_needed[i][k] belong to production k + 1 of agent i + 1
+    def set_parameters(self, batch_size, time_needed, max_time):
+        for i in self.agents:
+            for b, j in enumerate(self.buyers[i], 1):
+                coefficients = {self.prod[i, k, b]: batch_size[i - 1][k - 1] for k in self.productions}
+                coefficients[self.t[i, j]] = -1
+                self.c_batch_prod[i, b].set_linear_coefficients(coefficients)
+            self.c_time_prod[i].set_linear_coefficients(
+                {self.prod[i, k, b]: time_needed[i - 1][k - 1] for k in self.productions for b in range(1, len(self.agents))})
+            self.c_time_prod[i].ub = max_time[i - 1]
+        return self
+
+    # equilibrium is "global" or "barter", the constraints of the inactive equilibrium stay in the model without bounds
+    def set_equilibrium(self, equilibrium):
+        for constraints, active in ((self.c_equilibrium, equilibrium == "global"), (self.b_equilibrium, equilibrium == "barter")):
+            for constraint in constraints.values():
+                constraint.lb, constraint.ub = (0, 0) if active else (None, None)
+        return self
+
+    def optimize(self):
+        return self.model.optimize()
+
+    def report(self):
+        print("----------")
+        for var_name, var in self.model.variables.iteritems():
+            print(var_name, "=", var.primal)
+
+        print("status:", self.model.status)
+
+        print("Effective GDP:", self.model.objective.value)
+
+        for i in self.agents:
+            print("Actor {3} Sales: {0}, Purchases: {1}, Time spent: {2}".format(
+                sum(self.t[i, j].primal for j in self.buyers[i]),
+                sum(self.t[j, i].primal for j in self.buyers[i]),
+                self.c_time_prod[i].primal,
+                i))
+
+if __name__ == "__main__":
+    # we have three agents with three productions each
+    batch_size = [
+        [8, 7, 3],
+        [5, 2, 11],
+        [4, 1, 3]
+    ]
+    time_needed = [
+        [7, 6, 4],
+        [5, 3, 7],
+        [3, 2, 4]
+    ]
+    # production time constraint Z = 30
+    max_time = [30, 30, 30]
+
+    model = EquilibriumModel().set_parameters(batch_size, time_needed, max_time)
+    # model.set_equilibrium("global")
+    model.set_equilibrium("barter")
+    model.optimize()
+    model.report()
@@ -0,0 +1,59 @@
+import multiprocessing
+import sys
+
+import numpy as np
+
+import pure_optimization_lib
+
+# solves many economies on a pool of worker processes
+#
+# the pool lives as long as the solver, so optlang and GLPK are imported and set up once per worker
+# and every later batch reuses the same processes. results come back as soon as a worker finishes them,
+# in whatever order that happens, tagged with the position of their spec in the batch
+class BatchSolver:
+    def __init__(self, processes=None, equilibrium="global", timeout=None):
+        self.pool = multiprocessing.Pool(processes, initializer=init_worker, initargs=(equilibrium, timeout))
+
+    # yields (index, SolveResult) for every spec
+    def solve(self, specs, chunksize=1):
+        return self.pool.imap_unordered(solve_indexed, enumerate(specs), chunksize)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.pool.terminate()
+
+def format_result(index, result):
+    return "{0:>6} {1:<10} {2:>8.1f}  sales {3}  purchases {4}  time {5}".format(
+        index, result.status, result.objective,
+        np.array2string(result.sales, precision=0), np.array2string(result.purchases, precision=0),
+        np.array2string(result.time_spent, precision=0))
+
+# settings of a worker process, sent once per worker
+worker_equilibrium = None
+worker_timeout = None
+
+def init_worker(equilibrium, timeout):
+    global worker_equilibrium, worker_timeout
+    worker_equilibrium = equilibrium
+    worker_timeout = timeout
+
+def solve_indexed(item):
+    index, spec = item
+    return index, pure_optimization_lib.solve_spec(spec, worker_equilibrium, worker_timeout)
+
+if __name__ == "__main__":
+    # the same small economy with every agent's max_time between 20 and 40
+    base = pure_optimization_lib.generate_economy(4, seed=0)
+    specs = [base._replace(max_time=[max_time] * 4) for max_time in range(20, 41)]
+    with BatchSolver(timeout=int(sys.argv[1]) if len(sys.argv) > 1 else 20) as solver:
+        for index, result in solver.solve(specs):
+            print(format_result(index, result))
@@ -0,0 +1,156 @@
+import collections
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import pure_optimization_lib
+
+# same economy with the agents renumbered, agent k of the result is agent order[k] of spec
+def relabel(spec, order):
+    position = np.empty(len(order), dtype=np.int64)
+    position[list(order)] = np.arange(len(order))
+    edges = None
+    if spec.edges is not None:
+        edges = sorted(tuple(sorted((int(position[i]), int(position[j])))) for i, j in spec.edges)
+    return pure_optimization_lib.EconomySpec(
+        [spec.max_time[i] for i in order], [spec.productions[i] for i in order], edges)
+
+# number the distinct values in sorted order, so equal inputs get equal numbers in every economy
+def ranks(values):
+    rank = {value: i for i, value in enumerate(sorted(set(values)))}
+    return [rank[value] for value in values]
+
+# colour refinement (1-dimensional Weisfeiler-Lehman), agents keep splitting by the colours of their neighbours
+# until no colour class splits anymore
+def refine(colors, neighbours):
+    while True:
+        refined = ranks([(colors[i], tuple(sorted(colors[j] for j in neighbours[i]))) for i in range(len(colors))])
+        if max(refined, default=0) == max(colors, default=0):
+            return refined
+        colors = refined
+
+# order of the agents that is the same for every relabeling of an economy
+#
+# agents are coloured by max_time and their productions, the colours are refined over the trade network and
+# agents that still share a colour are individualized one at a time, the lowest index first, followed by another
+# refinement. on a complete network agents of one colour are interchangeable, so any tie break gives the same
+# economy. on sparse networks an unlucky tie break between agents that refinement cannot tell apart only costs
+# a cache miss, the key is a hash of the whole relabeled economy, so different economies never share a key
+def canonical_order(spec):
+    agents = len(spec.max_time)
+    colors = ranks([(spec.max_time[i], tuple(sorted(map(tuple, spec.productions[i])))) for i in range(agents)])
+    if spec.edges is None:
+        return sorted(range(agents), key=colors.__getitem__)
+    neighbours = [[] for _ in range(agents)]
+    for i, j in spec.edges:
+        neighbours[i].append(j)
+        neighbours[j].append(i)
+    colors = refine(colors, neighbours)
+    while True:
+        order = sorted(range(agents), key=colors.__getitem__)
+        tied = [k for k in range(agents - 1) if colors[order[k]] == colors[order[k + 1]]]
+        if not tied:
+            return order
+        chosen = order[tied[0]]
+        colors = refine([2 * color + (i != chosen) for i, color in enumerate(colors)], neighbours)
+
+# (key, order) where order maps the canonical economy back to spec, see relabel
+def canonical_key(spec, equilibrium="global"):
+    order = canonical_order(spec)
+    canonical = relabel(spec, order)
+    productions = [sorted(map(tuple, productions)) for productions in canonical.productions]
+    text = json.dumps([equilibrium, canonical.max_time, productions, canonical.edges], default=int)
+    return hashlib.sha256(text.encode()).hexdigest(), order
+
+# solve results on disk, one json file per key
+# the least recently used results are deleted once the files take more than max_bytes
+class SolutionCache:
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+        # key -> file size, least recently used first
+        self.sizes = collections.OrderedDict()
+        entries = []
+        for name in os.listdir(path):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(path, name))
+                entries.append((stat.st_mtime, name[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.sizes[key] = size
+        self.size = sum(self.sizes.values())
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def file(self, key):
+        return os.path.join(self.path, key + ".json")
+
+    def get(self, key):
+        if key not in self.sizes:
+            self.misses += 1
+            return None
+        with open(self.file(key)) as f:
+            data = json.load(f)
+        # the modification time orders the files when the cache is opened again
+        os.utime(self.file(key))
+        self.sizes.move_to_end(key)
+        self.hits += 1
+        return pure_optimization_lib.SolveResult(
+            data["status"], data["objective"],
+            np.array(data["sales"]), np.array(data["purchases"]), np.array(data["time_spent"]))
+
+    def put(self, key, result):
+        data = {
+            "status": result.status,
+            "objective": result.objective,
+            "sales": result.sales.tolist(),
+            "purchases": result.purchases.tolist(),
+            "time_spent": result.time_spent.tolist(),
+        }
+        with open(self.file(key), "w") as f:
+            json.dump(data, f)
+        self.size -= self.sizes.pop(key, 0)
+        self.sizes[key] = os.path.getsize(self.file(key))
+        self.size += self.sizes[key]
+        while self.size > self.max_bytes and len(self.sizes) > 1:
+            evicted, size = self.sizes.popitem(last=False)
+            os.remove(self.file(evicted))
+            self.size -= size
+
+# solve_spec that looks in the cache first
+# the canonical economy is solved and stored, so a cached result fits every relabeling of it once mapped back.
+# only optimal results are stored, a time limited solve may find a better solution on the next try
+def solve_cached(spec, cache, equilibrium="global", timeout=None):
+    key, order = canonical_key(spec, equilibrium)
+    result = cache.get(key)
+    if result is None:
+        result = pure_optimization_lib.solve_spec(relabel(spec, order), equilibrium, timeout)
+        if result.status == "optimal":
+            cache.put(key, result)
+    # agent order[k] of spec is agent k of the canonical economy
+    sales = np.empty_like(result.sales)
+    purchases = np.empty_like(result.purchases)
+    time_spent = np.empty_like(result.time_spent)
+    sales[order] = result.sales
+    purchases[order] = result.purchases
+    time_spent[order] = result.time_spent
+    return result._replace(sales=sales, purchases=purchases, time_spent=time_spent)
+
+if __name__ == "__main__":
+    cache = SolutionCache(sys.argv[1] if len(sys.argv) > 1 else "optimization_cache")
+    spec = pure_optimization_lib.generate_economy(4, seed=0)
+    rng = np.random.default_rng(0)
+    for i in range(5):
+        order = rng.permutation(len(spec.max_time)) if i else np.arange(len(spec.max_time))
+        start = time.perf_counter()
+        result = solve_cached(relabel(spec, order), cache)
+        print("Permutation {0}: GDP {1}, sales {2} in {3:.6f}s".format(
+            order.tolist(), result.objective, result.sales.tolist(), time.perf_counter() - start))
+    print("Cache: {0} hits, {1} misses, {2} entries".format(cache.hits, cache.misses, len(cache)))
@@ -1,6 +1,12 @@
 from __future__ import print_function
 from optlang import Model, Variable, Constraint, Objective
+from optlang import glpk_interface
+from optlang.symbolics import Zero
+import swiglpk
+import collections
 import itertools
+import time
+import numpy as np
 
 # this is essentially a discrete neoclassical model
 # we have three agents
@@ -47,35 +53,6 @@ class Agent:
 
 # actors cannot buy their own products so t_i_i is not necessary
 
-agent1 = Agent(1, 30, [
-    Production(8, 7),
-    Production(7, 6),
-    Production(3, 4)
-])
-agent2 = Agent(2, 30,[
-    Production(5, 5),
-    Production(2, 3),
-    Production(11, 7)
-])
-agent3 = Agent(3, 30,[
-    Production(4, 3),
-    Production(1, 2),
-    Production(3, 4)
-])
-
-agent_by_id = {
-    1 : agent1,
-    2 : agent2,
-    3 : agent3
-}
-
-agents = agent_by_id.values()
-
-for agent_id in agent_by_id:
-    for other_id in agent_by_id:
-        if agent_id != other_id:
-            agent_by_id[agent_id].add_agent(agent_by_id[other_id])
-
 # GDP maximization, aka all sales and all purchases
 def objective_from_agents(agents):
     objective_vars = []
@@ -84,6 +61,7 @@ def objective_from_agents(agents):
     return Objective(sum(objective_vars), direction='max')
 
 def global_constraints(agents):
+    agent_by_id = {agent.id: agent for agent in agents}
     constraints = []
     # global equilibrium constraint
     # all sales by agent1 to agent2 and agent3
@@ -101,12 +79,14 @@ def global_constraints(agents):
 
 def barter_constraints(agents):
     constraints = []
-    # find unique 2-agent pairs...
-    # todo generalize for n-agent tuples
+    # find unique 2-agent pairs, barter in longer cycles is BarterCycleModel
     agent_pairs = itertools.combinations(agents, 2)
     for pair in agent_pairs:
         agent1 = pair[0]
         agent2 = pair[1]
+        if agent2.id not in agent1.trade_to_vars:
+            # not neighbours in the trade network
+            continue
         var1 = agent1.trade_to_vars[agent2.id]
         var2 = agent2.trade_to_vars[agent1.id]
         constraints.append(Constraint(var1 - var2, lb=0, ub=0))
@@ -147,66 +127,892 @@ def batch_constraints(agents):
             constraints.append(Constraint(sum(buyers[other_agent]) - seller_var, lb=0, ub=0))
     return constraints
 
-# expected solution:
-# Effective GDP: 119.0
-# Actor 1 Sales: 32.0, Purchases: 32.0, Time spent: 28.0
-# Actor 2 Sales: 40.0, Purchases: 40.0, Time spent: 29.0
-# Actor 3 Sales: 40.0, Purchases: 40.0, Time spent: 30.0
-c_batch = batch_constraints(agents)
-
-# production time constraint Z = 30
-c_time = time_constraints(agents)
-
-# Variables, constraints and objective are combined in a Model object, which can subsequently be optimized.
-model = Model(name='Simple model')
-model.objective = objective_from_agents(agents)
-model.add(c_batch)
-model.add(c_time)
+# compact description of an economy
+# max_time[i] and productions[i], a list of (batch_size, time_needed), describe agent i + 1
+# edges lists the pairs of agent indices that may trade with each other, None means everybody trades with everybody
+EconomySpec = collections.namedtuple("EconomySpec", ["max_time", "productions", "edges"])
+
+# random economy of any size
+# productions, batch_size and time_needed are inclusive (low, high) ranges that are drawn from uniformly.
+# the trade network restricts who can trade with whom, so the number of variables grows with the edges instead of n^2:
+# complete     everybody trades with everybody
+# nearest      agents live at random points of the unit square and trade with their `degree` nearest neighbours
+# small_world  ring of `degree` neighbours where every edge is rewired to a random agent with probability `rewire`
+# regional     `regions` complete blocks of neighbouring agents, linked by `degree` random edges per agent
+def generate_economy(agents, productions=(1, 3), batch_size=(1, 12), time_needed=(2, 8), max_time=30,
+                     graph="complete", degree=4, rewire=0.1, regions=10, seed=None):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(productions[0], productions[1] + 1, agents)
+    batch_sizes = rng.integers(batch_size[0], batch_size[1] + 1, counts.sum()).tolist()
+    times_needed = rng.integers(time_needed[0], time_needed[1] + 1, counts.sum()).tolist()
+    offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+    spec_productions = [
+        list(zip(batch_sizes[offsets[i]:offsets[i + 1]], times_needed[offsets[i]:offsets[i + 1]])) for i in range(agents)
+    ]
+    return EconomySpec([max_time] * agents, spec_productions, trade_network(agents, graph, degree, rewire, regions, rng))
+
+def trade_network(agents, graph, degree, rewire, regions, rng):
+    if graph == "complete":
+        return None
+    if graph == "nearest":
+        points = rng.random((agents, 2))
+        neighbours = np.empty((agents, min(degree, agents - 1)), dtype=np.int64)
+        # distances in blocks of rows to keep memory linear in the number of agents
+        for start in range(0, agents, 1024):
+            distance = ((points[start:start + 1024, None, :] - points[None, :, :]) ** 2).sum(axis=-1)
+            distance[np.arange(len(distance)), np.arange(start, start + len(distance))] = np.inf
+            neighbours[start:start + 1024] = np.argpartition(distance, neighbours.shape[1] - 1, axis=1)[:, :neighbours.shape[1]]
+        first = np.repeat(np.arange(agents), neighbours.shape[1])
+        second = neighbours.ravel()
+    elif graph == "small_world":
+        first = np.repeat(np.arange(agents), max(1, degree // 2))
+        second = (first + np.tile(np.arange(1, max(1, degree // 2) + 1), agents)) % agents
+        rewired = rng.random(len(first)) < rewire
+        second[rewired] = rng.integers(0, agents, rewired.sum())
+    elif graph == "regional":
+        region = np.arange(agents) * regions // agents
+        blocks = [np.flatnonzero(region == r) for r in range(regions)]
+        pairs = [np.array(list(itertools.combinations(block, 2)), dtype=np.int64).reshape(-1, 2) for block in blocks]
+        first = np.concatenate([pair[:, 0] for pair in pairs] + [np.repeat(np.arange(agents), degree)])
+        second = np.concatenate([pair[:, 1] for pair in pairs] + [rng.integers(0, agents, agents * degree)])
+    else:
+        raise ValueError("unknown trade network {0}".format(graph))
+    # undirected, without self loops and duplicates
+    edges = np.stack([np.minimum(first, second), np.maximum(first, second)], axis=1)
+    edges = np.unique(edges[edges[:, 0] != edges[:, 1]], axis=0)
+    return [tuple(edge) for edge in edges.tolist()]
+
+# agents of an EconomySpec that know about their trading partners
+def build_agents(spec):
+    agents = [
+        Agent(i + 1, spec.max_time[i], [Production(batch_size, time_needed) for batch_size, time_needed in spec.productions[i]])
+        for i in range(len(spec.max_time))
+    ]
+    if spec.edges is None:
+        for agent in agents:
+            for other_agent in agents:
+                if agent is not other_agent:
+                    agent.add_agent(other_agent)
+    else:
+        for i, j in spec.edges:
+            agents[i].add_agent(agents[j])
+            agents[j].add_agent(agents[i])
+    return agents
+
+# builds the same model as the *_constraints functions above, but never sums optlang expressions.
+# every constraint becomes a row of a coefficient matrix that is collected in coordinate (COO) form
+# straight from the Agent/Production structures and sorted into CSR order. load_matrix hands GLPK the whole
+# matrix in a single glp_load_matrix call, other solvers get it row by row through set_linear_coefficients,
+# both skip the symbolic expression layer entirely
+class SparseModelBuilder:
+    def __init__(self, agents):
+        self.agents = list(agents)
+        self.agent_by_id = {agent.id: agent for agent in self.agents}
+        self.variables = []
+        self.column_by_name = {}
+        self.rows = []
+        self.columns = []
+        self.coefficients = []
+        self.lower_bounds = []
+        self.upper_bounds = []
+        # kind of constraint -> row numbers, in the order of the agents
+        self.rows_by_kind = {}
+        self.constraints_by_kind = {}
+
+    def column(self, variable):
+        if variable.name not in self.column_by_name:
+            self.column_by_name[variable.name] = len(self.variables)
+            self.variables.append(variable)
+        return self.column_by_name[variable.name]
+
+    def add_row(self, kind, entries, lb, ub):
+        row = len(self.lower_bounds)
+        for variable, coefficient in entries:
+            self.rows.append(row)
+            self.columns.append(self.column(variable))
+            self.coefficients.append(coefficient)
+        self.lower_bounds.append(lb)
+        self.upper_bounds.append(ub)
+        self.rows_by_kind.setdefault(kind, []).append(row)
+        return row
+
+    # sum of production batches sold to a buyer equals the trade with that buyer
+    def add_batch_constraints(self):
+        for agent in self.agents:
+            for other_agent in agent.trade_to_vars:
+                entries = [(prod.trade_to_vars[other_agent], prod.batch_size) for prod in agent.production]
+                entries.append((agent.trade_to_vars[other_agent], -1))
+                self.add_row("batch", entries, 0, 0)
+        return self
+
+    # production time of every agent is limited by max_time
+    def add_time_constraints(self):
+        for agent in self.agents:
+            entries = [(prod.trade_to_vars[other_agent], prod.time_needed)
+                       for prod in agent.production for other_agent in prod.trade_to_vars]
+            self.add_row("time", entries, 0, agent.max_time)
+        return self
+
+    # sales of every agent equal its purchases
+    def add_global_constraints(self):
+        for agent in self.agents:
+            entries = [(agent.trade_to_vars[other_agent], 1) for other_agent in agent.trade_to_vars]
+            entries += [(self.agent_by_id[other_agent].trade_to_vars[agent.id], -1) for other_agent in agent.trade_to_vars]
+            self.add_row("global", entries, 0, 0)
+        return self
+
+    # every pair of agents trades equal amounts with each other
+    def add_barter_constraints(self):
+        for agent1, agent2 in itertools.combinations(self.agents, 2):
+            if agent2.id in agent1.trade_to_vars:
+                self.add_row("barter", [(agent1.trade_to_vars[agent2.id], 1), (agent2.trade_to_vars[agent1.id], -1)], 0, 0)
+        return self
+
+    # "global" or "barter" equilibrium
+    def add_equilibrium_constraints(self, equilibrium):
+        if equilibrium == "global":
+            return self.add_global_constraints()
+        if equilibrium == "barter":
+            return self.add_barter_constraints()
+        raise ValueError("unknown equilibrium {0}".format(equilibrium))
+
+    # agents of a class are interchangeable, so their sales can be required to fall in the order of the class
+    def add_symmetry_constraints(self, classes):
+        for agent_ids in classes:
+            for first, second in zip(agent_ids, agent_ids[1:]):
+                entries = [(var, 1) for var in self.agent_by_id[first].trade_to_vars.values()]
+                entries += [(var, -1) for var in self.agent_by_id[second].trade_to_vars.values()]
+                self.add_row("symmetry", entries, 0, None)
+        return self
+
+    # (indptr, indices, data) of the constraint matrix
+    def csr(self):
+        rows = np.asarray(self.rows, dtype=np.int64)
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(len(self.lower_bounds) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.lower_bounds)), out=indptr[1:])
+        return indptr, np.asarray(self.columns, dtype=np.int64)[order], np.asarray(self.coefficients, dtype=float)[order]
+
+    # GDP maximization over all trade variables
+    def build(self, name=None):
+        trade_vars = [var for agent in self.agents for var in agent.trade_to_vars.values()]
+        for var in trade_vars:
+            self.column(var)
+
+        # empty rows are added before the columns, optlang allocates an array over all columns for every new row
+        model = Model(name=name)
+        constraints = [Constraint(Zero, lb=lb, ub=ub) for lb, ub in zip(self.lower_bounds, self.upper_bounds)]
+        model.add(constraints)
+        model.update()
+        model.add(self.variables)
+        model.update()
+
+        self.load_matrix(model, constraints)
+
+        model.objective = Objective(Zero, direction='max')
+        model.objective.set_linear_coefficients({var: 1 for var in trade_vars})
+
+        for kind, rows in self.rows_by_kind.items():
+            self.constraints_by_kind[kind] = [constraints[row] for row in rows]
+        return model
+
+    def load_matrix(self, model, constraints):
+        indptr, indices, data = self.csr()
+        if isinstance(model, glpk_interface.Model):
+            # GLPK takes the whole matrix in one call, setting it row by row through optlang
+            # allocates arrays over all columns for every row
+            # the model is fresh, so GLPK numbers rows and columns in the order they were added
+            rows = np.repeat(np.arange(1, len(constraints) + 1), np.diff(indptr))
+            columns = indices + 1
+            ia = swiglpk.intArray(len(data) + 1)
+            ja = swiglpk.intArray(len(data) + 1)
+            ar = swiglpk.doubleArray(len(data) + 1)
+            for i, (row, column, coefficient) in enumerate(zip(rows.tolist(), columns.tolist(), data.tolist())):
+                ia[i + 1] = row
+                ja[i + 1] = column
+                ar[i + 1] = coefficient
+            swiglpk.glp_load_matrix(model.problem, len(data), ia, ja, ar)
+            return
+        for row, constraint in enumerate(constraints):
+            start, stop = indptr[row], indptr[row + 1]
+            constraint.set_linear_coefficients(
+                {self.variables[column]: coefficient for column, coefficient in zip(indices[start:stop], data[start:stop])})
+
+# whether the last solve found an integer solution, a time limited solve may still have one
+def has_solution(model):
+    if isinstance(model, glpk_interface.Model):
+        return swiglpk.glp_mip_status(model.problem) in (swiglpk.GLP_OPT, swiglpk.GLP_FEAS)
+    return model.status == "optimal"
+
+# outcome of a solve, sales, purchases and time_spent hold one value per agent in the order of the agents
+SolveResult = collections.namedtuple("SolveResult", ["status", "objective", "sales", "purchases", "time_spent"])
+
+def solve_result(agents, model, status):
+    if not has_solution(model):
+        missing = np.full(len(agents), np.nan)
+        return SolveResult(status, np.nan, missing, missing, missing)
+    return result_from_values(agents, model.primal_values, status, model.objective.value)
+
+# SolveResult of variable values by name
+def result_from_values(agents, values, status, objective):
+    sales = np.zeros(len(agents))
+    purchases = np.zeros(len(agents))
+    time_spent = np.zeros(len(agents))
+    index_by_id = {agent.id: i for i, agent in enumerate(agents)}
+    for i, agent in enumerate(agents):
+        for other_agent, var in agent.trade_to_vars.items():
+            sales[i] += values[var.name]
+            purchases[index_by_id[other_agent]] += values[var.name]
+        for prod in agent.production:
+            time_spent[i] += prod.time_needed * sum(values[var.name] for var in prod.trade_to_vars.values())
+    return SolveResult(status, objective, sales, purchases, time_spent)
+
+# what presolve removed from and added to an economy
+# symmetry_classes lists the agent ids of every class of interchangeable agents
+PresolveReport = collections.namedtuple(
+    "PresolveReport", ["removed_productions", "removed_variables", "symmetry_classes", "added_constraints"])
+
+# shrinks the model of an EconomySpec before it is built
+#
+# a production is dominated when the same agent has a production of the same batch_size that needs less time,
+# or when it takes longer than max_time, every solution can do without it.
+# agents with the same max_time, the same productions and the same trading partners can swap places in any
+# solution, so sales within such a class may be required to fall in agent order, which cuts off the mirror
+# images of every branch. GLPK does not report its branch and bound node counts through optlang, the savings
+# show up in solve time instead
+def presolve(spec):
+    productions = []
+    removed_productions = 0
+    removed_variables = 0
+    degree = [len(spec.max_time) - 1] * len(spec.max_time)
+    neighbours = None
+    if spec.edges is not None:
+        neighbours = [set() for _ in spec.max_time]
+        for i, j in spec.edges:
+            neighbours[i].add(j)
+            neighbours[j].add(i)
+        degree = [len(agent_neighbours) for agent_neighbours in neighbours]
+    for i, agent_productions in enumerate(spec.productions):
+        fastest = {}
+        for batch_size, time_needed in agent_productions:
+            if time_needed <= spec.max_time[i] and time_needed < fastest.get(batch_size, float("inf")):
+                fastest[batch_size] = time_needed
+        productions.append(sorted(fastest.items()))
+        removed = len(agent_productions) - len(fastest)
+        removed_productions += removed
+        removed_variables += removed * degree[i]
+
+    # on a sparse network two agents can swap places if they have the same partners apart from each other,
+    # for agents that trade with each other that means the same partners including themselves
+    groups = collections.defaultdict(list)
+    for i in range(len(spec.max_time)):
+        key = (spec.max_time[i], tuple(productions[i]))
+        if neighbours is None:
+            groups[key].append(i + 1)
+        else:
+            groups[key, "open", frozenset(neighbours[i])].append(i + 1)
+            groups[key, "closed", frozenset(neighbours[i] | {i})].append(i + 1)
+    classes = sorted(agent_ids for agent_ids in groups.values() if len(agent_ids) > 1)
+    report = PresolveReport(removed_productions, removed_variables, classes, sum(len(c) - 1 for c in classes))
+    return spec._replace(productions=productions), report
+
+# builds and solves the GDP model of an EconomySpec
+def solve_spec(spec, equilibrium="global", timeout=None, presolved=False):
+    classes = []
+    if presolved:
+        spec, report = presolve(spec)
+        classes = report.symmetry_classes
+    agents = build_agents(spec)
+    builder = SparseModelBuilder(agents).add_batch_constraints().add_time_constraints()
+    model = builder.add_equilibrium_constraints(equilibrium).add_symmetry_constraints(classes).build()
+    if timeout is not None:
+        model.configuration.timeout = timeout
+    return solve_result(agents, model, model.optimize())
+
+# outcome of solve_heuristic, bound is the optimum of the LP relaxation and gap the share of it that result misses
+HeuristicResult = collections.namedtuple("HeuristicResult", ["result", "bound", "gap"])
+
+# most an agent can sell when batches may be split, all of its time goes into its best batch_size/time_needed ratio
+def sales_capacity(agent):
+    return agent.max_time * max([prod.batch_size / prod.time_needed for prod in agent.production], default=0)
+
+# optimum of the LP relaxation of the GDP model
+#
+# without integrality every agent only uses its best ratio, so the production variables drop out and what is left
+# is a flow of trade limited by each agent's sales capacity, balanced by the equilibrium constraints.
+# on a complete network that flow only has to keep any one agent from selling more than all others together,
+# which both equilibria can always arrange, on any other network the small flow LP is solved
+def relaxation_bound(spec, agents, equilibrium="global"):
+    capacity = [sales_capacity(agent) for agent in agents]
+    if spec.edges is None:
+        largest = max(capacity, default=0)
+        return sum(capacity) if largest <= sum(capacity) - largest else 2 * (sum(capacity) - largest)
+    builder = SparseModelBuilder(agents)
+    for agent, agent_capacity in zip(agents, capacity):
+        builder.add_row("capacity", [(var, 1) for var in agent.trade_to_vars.values()], 0, agent_capacity)
+    model = builder.add_equilibrium_constraints(equilibrium).build()
+    for var in model.variables:
+        var.type = "continuous"
+    model.optimize()
+    bound = model.objective.value
+    for var in model.variables:
+        var.type = "integer"
+    return bound
+
+# least time each agent of an EconomySpec needs to sell exactly v for v = 0..limit, and the index of the
+# production whose batch it sold last, as (agents, limit + 1) arrays. one pass over v serves all agents at once
+def min_time_tables(spec, limit):
+    agents = len(spec.max_time)
+    width = max([len(productions) for productions in spec.productions], default=0)
+    # missing productions get a batch that never fits
+    batch_size = np.full((agents, width), limit + 1, dtype=np.int64)
+    time_needed = np.zeros((agents, width))
+    for i, productions in enumerate(spec.productions):
+        for k, (prod_batch_size, prod_time_needed) in enumerate(productions):
+            batch_size[i, k] = prod_batch_size
+            time_needed[i, k] = prod_time_needed
+    min_time = np.full((agents, limit + 1), np.inf)
+    min_time[:, 0] = 0
+    last_production = np.full((agents, limit + 1), -1, dtype=np.int64)
+    rows = np.arange(agents)
+    for v in range(1, limit + 1):
+        for k in range(width):
+            fits = batch_size[:, k] <= v
+            candidate = np.full(agents, np.inf)
+            candidate[fits] = min_time[rows[fits], v - batch_size[fits, k]] + time_needed[fits, k]
+            better = candidate < min_time[:, v]
+            min_time[better, v] = candidate[better]
+            last_production[better, v] = k
+    return min_time, last_production
+
+def spec_capacity(spec):
+    return [max_time * max([batch_size / time_needed for batch_size, time_needed in productions], default=0)
+            for max_time, productions in zip(spec.max_time, spec.productions)]
+
+# (first, second) agent indices of every pair that may trade, first < second
+def spec_pairs(spec):
+    if spec.edges is None:
+        return np.triu_indices(len(spec.max_time), 1)
+    edges = np.array(spec.edges, dtype=np.int64).reshape(-1, 2)
+    return edges.min(axis=1), edges.max(axis=1)
+
+# feasible integer solution made of barter trades, which satisfy both equilibria
+#
+# two neighbours can trade any value both of them can sell exactly with their spare time. the trade with the
+# most GDP per hour spent, counting the largest such value of every pair, is made first, then only the pairs of
+# the two agents involved need another look. every trade uses up time, so the loop ends.
+# spent is time the agents already spent on other trades, min_time the tables of min_time_tables if they are at hand.
+# returns the trades as (seller, buyer, value) arrays and the time every agent spent, spent included
+def barter_trades(spec, spent=None, min_time=None):
+    if min_time is None:
+        min_time, _ = min_time_tables(spec, int(max(spec_capacity(spec), default=0)))
+    limit = min_time.shape[1] - 1
+    spare = np.array(spec.max_time, dtype=float)
+    if spent is not None:
+        spare -= spent
+    first, second = spec_pairs(spec)
+    pairs_by_agent = [[] for _ in spec.max_time]
+    for pair, (i, j) in enumerate(zip(first.tolist(), second.tolist())):
+        pairs_by_agent[i].append(pair)
+        pairs_by_agent[j].append(pair)
+    value = np.zeros(len(first), dtype=np.int64)
+    efficiency = np.full(len(first), -1.0)
+
+    def evaluate(rows):
+        fits = (min_time[first[rows]] <= spare[first[rows], None]) & (min_time[second[rows]] <= spare[second[rows], None])
+        fits[:, 0] = False
+        largest = limit - np.argmax(fits[:, ::-1], axis=1)
+        found = fits.any(axis=1)
+        value[rows] = np.where(found, largest, 0)
+        hours = min_time[first[rows], largest] + min_time[second[rows], largest]
+        efficiency[rows] = np.where(found, 2 * largest / np.where(found, hours, 1), -1)
+
+    # in blocks, every pair looks at a row of the tables
+    for start in range(0, len(first), 4096):
+        evaluate(np.arange(start, min(start + 4096, len(first))))
+    trades = collections.defaultdict(int)
+    while len(first) and efficiency.max() > 0:
+        pair = int(np.argmax(efficiency))
+        i, j, v = first[pair], second[pair], int(value[pair])
+        spare[i] -= min_time[i, v]
+        spare[j] -= min_time[j, v]
+        trades[pair] += v
+        evaluate(np.array(sorted(set(pairs_by_agent[i]) | set(pairs_by_agent[j]))))
+    pairs = np.array(sorted(trades), dtype=np.int64)
+    values = np.array([trades[pair] for pair in pairs.tolist()], dtype=float)
+    sellers = np.concatenate([first[pairs], second[pairs]])
+    buyers = np.concatenate([second[pairs], first[pairs]])
+    return (sellers, buyers, np.concatenate([values, values])), np.array(spec.max_time, dtype=float) - spare
+
+# SolveResult of trades in which everybody buys as much as they sell
+def trade_result(spec, trades, time_spent, status, objective=None):
+    sellers, buyers, values = trades
+    sales = np.bincount(sellers, values, len(spec.max_time))
+    purchases = np.bincount(buyers, values, len(spec.max_time))
+    return SolveResult(status, values.sum() if objective is None else objective, sales, purchases, time_spent)
+
+# quick solve for what-if questions
+# the LP relaxation gives an upper bound on GDP and barter_trades a feasible integer solution,
+# the MILP is only solved when that solution misses more than max_gap of the bound
+def solve_heuristic(spec, equilibrium="global", max_gap=0.05, timeout=None):
+    agents = build_agents(spec)
+    bound = relaxation_bound(spec, agents, equilibrium)
+    result = trade_result(spec, *barter_trades(spec), status="feasible")
+    if bound > 0 and (bound - result.objective) / bound > max_gap:
+        builder = SparseModelBuilder(agents).add_batch_constraints().add_time_constraints()
+        model = builder.add_equilibrium_constraints(equilibrium).build()
+        if timeout is not None:
+            model.configuration.timeout = timeout
+        exact = solve_result(agents, model, model.optimize())
+        if exact.objective >= result.objective:
+            result = exact
+    gap = (bound - result.objective) / bound if bound > 0 else 0.0
+    return HeuristicResult(result, bound, gap)
+
+# (best multiplier, index) of the neighbours of every agent, -inf and -1 for agents without neighbours
+def best_neighbours(spec, multipliers, sellers, buyers):
+    if spec.edges is None:
+        if len(multipliers) < 2:
+            return np.full(len(multipliers), -np.inf), np.full(len(multipliers), -1)
+        top = int(np.argmax(multipliers))
+        second = int(np.argmax(np.where(np.arange(len(multipliers)) == top, -np.inf, multipliers)))
+        buyer = np.full(len(multipliers), top)
+        buyer[top] = second
+        return multipliers[buyer], buyer
+    best = np.full(len(multipliers), -np.inf)
+    np.maximum.at(best, sellers, multipliers[buyers])
+    buyer = np.full(len(multipliers), -1)
+    on_best = np.flatnonzero(multipliers[buyers] == best[sellers])
+    buyer[sellers[on_best]] = buyers[on_best]
+    return best, buyer
+
+# cycles of agents in which every agent hands its goods to the next one, as a (cycles, longest) array of the agents
+# of every cycle from its smallest agent on, padded with that agent, and the length of every cycle.
+# agents that do not sell and agents that hand to one of them end the hand-overs. after 2^k hand-overs with
+# 2^k >= number of agents everybody has arrived on a cycle, so both the cycles and their smallest agents are found
+# by doubling
+def hand_over_cycles(selling, buyer):
+    agents = np.arange(len(selling))
+    # hand-overs that end stay with the agent
+    following = np.where(selling & (buyer >= 0) & selling[np.maximum(buyer, 0)], buyer, agents)
+    after = following
+    smallest = agents
+    for _ in range(max(len(agents) - 1, 1).bit_length()):
+        smallest = np.minimum(smallest, smallest[after])
+        after = after[after]
+    on_cycle = np.zeros(len(agents), dtype=bool)
+    on_cycle[after] = True
+    starts = agents[on_cycle & (smallest == agents) & (following != agents)]
+    columns = [starts]
+    lengths = np.ones(len(starts), dtype=np.int64)
+    current = following[starts]
+    unfinished = current != starts
+    while unfinished.any():
+        lengths += unfinished
+        columns.append(np.where(unfinished, current, starts))
+        current = following[current]
+        unfinished &= current != starts
+    return np.stack(columns, axis=1), lengths
+
+# feasible solution repaired from the subproblems of solve_lagrangian at the given multipliers
+#
+# every agent that still sells hands its goods to the neighbour with the highest multiplier among the agents that
+# still sell. every agent of a cycle of these hand-overs sells the largest value all of them can still sell exactly
+# in time to the next one, which keeps everyone balanced. agents that cannot sell anything more drop out, a cycle
+# without a common value drops the agent that can sell the least, and the hand-overs are followed again until no
+# cycle is left. barter_trades fills the time that is left
+def lagrangian_trades(spec, min_time, multipliers, selling, sellers, buyers):
+    limit = min_time.shape[1] - 1
+    max_time = np.array(spec.max_time, dtype=float)
+    # least time any sale takes
+    cheapest = min_time[:, 1:].min(axis=1, initial=np.inf)
+    sales = np.zeros(len(max_time))
+    spent = np.zeros(len(max_time))
+    selling = selling.copy()
+    while True:
+        spare = max_time - spent
+        selling &= cheapest <= spare
+        _, buyer = best_neighbours(spec, np.where(selling, multipliers, -np.inf), sellers, buyers)
+        cycles, lengths = hand_over_cycles(selling, buyer)
+        if len(cycles) == 0:
+            break
+        # the padding repeats an agent of the cycle, which changes nothing about the values all of them can sell
+        fits = min_time[cycles] <= spare[cycles][:, :, None]
+        fits[:, :, 0] = False
+        common = fits.all(axis=1)
+        found = common.any(axis=1)
+        # the value with the most GDP per hour, the larger one of equally good values
+        members = np.arange(cycles.shape[1]) < lengths[:, None]
+        hours = np.where(members[:, :, None] & common[:, None, :], min_time[cycles], 0).sum(axis=1)
+        efficiency = np.where(common, np.arange(limit + 1) / np.where(common, hours, 1), -1)
+        value = limit - np.argmax(efficiency[:, ::-1], axis=1)
+        traded = cycles[found][members[found]]
+        values = np.repeat(value[found], lengths[found])
+        sales[traded] += values
+        spent[traded] += min_time[traded, values]
+        largest = limit - np.argmax(fits[~found][:, :, ::-1], axis=2)
+        selling[cycles[~found][np.arange(len(largest)), np.argmin(largest, axis=1)]] = False
+    (barter_sellers, _, values), time_spent = barter_trades(spec, spent, min_time)
+    sales += np.bincount(barter_sellers, values, len(max_time))
+    return SolveResult("feasible", sales.sum(), sales, sales.copy(), time_spent)
+
+# Lagrangian decomposition of the GDP model with the global equilibrium
+#
+# the balance of sales and purchases is the only constraint that couples the agents. moving it into the objective
+# with one multiplier per agent makes every unit agent i sells to agent j worth 1 - multiplier_i + multiplier_j,
+# so each agent on its own sells as much as its integer batches allow within max_time to the neighbour with the
+# highest multiplier, or nothing when even that is not worth it. the subproblems of all agents are solved in one
+# vectorized pass, each is far too small to be worth a worker process.
+# the subproblem optimum bounds GDP from above, the multipliers follow the subgradient purchases - sales with a
+# step towards the best feasible solution found (Polyak), which is halved whenever the bound stalls.
+# feasible solutions start from barter_trades, lagrangian_trades repairs the subproblem solution at multipliers
+# that improved the bound, at most every repair_every iterations and once more at the multipliers of the best bound.
+# the best of them is the result, the search stops once the gap between it and the bound is below tolerance
+def solve_lagrangian(spec, iterations=500, tolerance=0.01, step_scale=1.0, patience=10, repair_every=25):
+    limit = int(max(spec_capacity(spec), default=0))
+    min_time, _ = min_time_tables(spec, limit)
+    max_time = np.array(spec.max_time, dtype=float)
+    # most every agent can sell in whole batches, and the time that takes
+    capacity = limit - np.argmax((min_time <= max_time[:, None])[:, ::-1], axis=1)
+    capacity_time = min_time[np.arange(len(capacity)), capacity]
+
+    result = trade_result(spec, *barter_trades(spec, min_time=min_time), status="feasible")
+    first, second = spec_pairs(spec)
+    sellers = np.concatenate([first, second])
+    buyers = np.concatenate([second, first])
+    multipliers = np.zeros(len(capacity))
+    bound = np.inf
+    stalled = 0
+    # multipliers and subproblem sales of the best bound if they were not repaired yet, and the last repair
+    unrepaired = None
+    last_repair = -repair_every
+    for iteration in range(iterations):
+        best, buyer = best_neighbours(spec, multipliers, sellers, buyers)
+        selling = 1 - multipliers + best > 0
+        sales = np.where(selling, capacity, 0).astype(float)
+        value = np.sum(np.where(selling, (1 - multipliers + best) * capacity, 0))
+        purchases = np.bincount(buyer[selling], sales[selling], len(capacity))
+        if value < bound - 1e-9:
+            bound = value
+            stalled = 0
+            unrepaired = multipliers.copy(), selling
+            if iteration - last_repair >= repair_every:
+                result = max(result, lagrangian_trades(spec, min_time, multipliers, selling, sellers, buyers),
+                             key=lambda solution: solution.objective)
+                unrepaired = None
+                last_repair = iteration
+        else:
+            stalled += 1
+            if stalled >= patience:
+                step_scale /= 2
+                stalled = 0
+        subgradient = purchases - sales
+        if not subgradient.any():
+            # everybody buys what they sell, the subproblem solution is feasible and therefore optimal
+            result = SolveResult("optimal", sales.sum(), sales, purchases, np.where(selling, capacity_time, 0))
+            bound = min(bound, result.objective)
+            unrepaired = None
+            break
+        if bound <= 0 or (bound - result.objective) / bound <= tolerance:
+            break
+        step = step_scale * (value - result.objective) / subgradient.dot(subgradient)
+        multipliers -= step * subgradient
+    if unrepaired is not None:
+        result = max(result, lagrangian_trades(spec, min_time, unrepaired[0], unrepaired[1], sellers, buyers),
+                     key=lambda solution: solution.objective)
+    gap = (bound - result.objective) / bound if bound > 0 else 0.0
+    return HeuristicResult(result, bound, gap)
+
+# splits a balanced trade flow {(seller, buyer): amount} into cycles, as (cycle, amount) with every cycle
+# starting from its smallest agent. each step follows trade from agent to agent until an agent repeats
+# and takes the smallest amount along that cycle out of the flow
+def decompose_cycles(flow, epsilon=1e-6):
+    flow = {edge: amount for edge, amount in flow.items() if amount > epsilon}
+    sellers = collections.defaultdict(set)
+    for seller, buyer in flow:
+        sellers[seller].add(buyer)
+    cycles = []
+    while flow:
+        path = [next(iter(flow))[0]]
+        position = {path[0]: 0}
+        while True:
+            buyer = next(iter(sellers[path[-1]]))
+            if buyer in position:
+                cycle = path[position[buyer]:]
+                break
+            position[buyer] = len(path)
+            path.append(buyer)
+        edges = list(zip(cycle, cycle[1:] + cycle[:1]))
+        amount = min(flow[edge] for edge in edges)
+        for edge in edges:
+            flow[edge] -= amount
+            if flow[edge] <= epsilon:
+                del flow[edge]
+                sellers[edge[0]].discard(edge[1])
+        smallest = cycle.index(min(cycle))
+        cycles.append((tuple(cycle[smallest:] + cycle[:smallest]), amount))
+    return cycles
+
+# barter in cycles of up to max_length agents, every agent of a cycle hands the same amount to the next one
+#
+# pairwise barter is the case of cycles of two, but there are far too many longer cycles to write them all down.
+# the model starts with the cycles of two, every trade variable equals the sum of the cycles through its edge,
+# and longer cycles are added lazily as columns:
+# first the LP relaxation with the global equilibrium is solved, any balanced trade splits into cycles and the
+# short cycles of that trade are added. then the LP relaxation of the cycle model is solved, with the duals of the
+# link constraints a cycle pays off when the duals along its edges add up to more than zero, which a depth limited
+# search finds, those cycles are added and the LP solved again until no cycle pays off.
+# the MILP is then solved over the cycles collected so far, an integer optimum that needs another cycle is missed
+class BarterCycleModel:
+    def __init__(self, agents, max_length=3, name=None):
+        self.agents = list(agents)
+        self.agent_by_id = {agent.id: agent for agent in self.agents}
+        self.max_length = max_length
+        builder = SparseModelBuilder(self.agents).add_batch_constraints().add_time_constraints()
+        self.edges = [(agent.id, other_agent) for agent in self.agents for other_agent in agent.trade_to_vars]
+        for agent_id, other_agent in self.edges:
+            builder.add_row("link", [(self.agent_by_id[agent_id].trade_to_vars[other_agent], 1)], 0, 0)
+        self.model = builder.build(name)
+        self.link_by_edge = dict(zip(self.edges, builder.constraints_by_kind.get("link", [])))
+        self.cycle_vars = {}
+        self.bound = None
+        self.iterations = 0
+        for agent_id, other_agent in self.edges:
+            if agent_id < other_agent:
+                self.add_cycle((agent_id, other_agent))
+
+    # columns added while pricing the LP relaxation are continuous like the rest of the model
+    def add_cycle(self, cycle, type="integer"):
+        var = Variable("cycle_" + "_".join(str(agent_id) for agent_id in cycle), lb=0, type=type)
+        self.model.add(var)
+        self.model.update()
+        for edge in zip(cycle, cycle[1:] + cycle[:1]):
+            self.link_by_edge[edge].set_linear_coefficients({var: -1})
+        self.cycle_vars[cycle] = var
+
+    # cycles of the balanced trade that maximizes the LP relaxation with the global equilibrium
+    def relaxation_cycles(self):
+        # agent ids can be any numbers, the spec refers to agents by their position in self.agents
+        position = {agent.id: i for i, agent in enumerate(self.agents)}
+        spec = EconomySpec(
+            [agent.max_time for agent in self.agents],
+            [[(prod.batch_size, prod.time_needed) for prod in agent.production] for agent in self.agents],
+            [(position[agent_id], position[other_agent]) for agent_id, other_agent in self.edges if agent_id < other_agent])
+        agents = build_agents(spec)
+        builder = SparseModelBuilder(agents).add_batch_constraints().add_time_constraints()
+        model = builder.add_global_constraints().build()
+        for var in model.variables:
+            var.type = "continuous"
+        model.optimize()
+        # build_agents numbers the agents 1..n in the order of self.agents
+        flow = {(self.agents[agent.id - 1].id, self.agents[other_agent - 1].id): var.primal
+                for agent in agents for other_agent, var in agent.trade_to_vars.items()}
+        return [cycle for cycle, _ in decompose_cycles(flow) if len(cycle) <= self.max_length]
+
+    # cycles not in the model whose edge duals add up to more than epsilon, best first
+    def price(self, duals, limit, epsilon=1e-6):
+        found = []
+
+        def extend(path, weight):
+            last = path[-1]
+            for other_agent in self.agent_by_id[last].trade_to_vars:
+                # every cycle is only found from its smallest agent
+                if other_agent == path[0] and len(path) > 1:
+                    cycle = tuple(path)
+                    if weight + duals[last, other_agent] > epsilon and cycle not in self.cycle_vars:
+                        found.append((weight + duals[last, other_agent], cycle))
+                elif other_agent > path[0] and other_agent not in path and len(path) < self.max_length:
+                    path.append(other_agent)
+                    extend(path, weight + duals[last, other_agent])
+                    path.pop()
+
+        for agent in self.agents:
+            extend([agent.id], 0)
+        found.sort(reverse=True)
+        return [cycle for _, cycle in found[:limit]]
+
+    def optimize(self, columns_per_round=50, max_iterations=100):
+        for cycle in self.relaxation_cycles():
+            if cycle not in self.cycle_vars:
+                self.add_cycle(cycle)
+        for var in self.model.variables:
+            var.type = "continuous"
+        for self.iterations in range(1, max_iterations + 1):
+            self.model.optimize()
+            duals = {edge: constraint.dual for edge, constraint in self.link_by_edge.items()}
+            cycles = self.price(duals, columns_per_round)
+            if not cycles:
+                break
+            for cycle in cycles:
+                self.add_cycle(cycle, "continuous")
+        self.bound = self.model.objective.value
+        for var in self.model.variables:
+            var.type = "integer"
+        return self.model.optimize()
+
+# tells GLPK whether to start the next solve from the solution of the last one, returns whether it will.
+# optlang has no option for this, it depends on optlang's internal GLPK parameter struct configuration._iocp,
+# so a configuration without it always gets a cold solve
+def use_initial_solution(configuration, use):
+    if not hasattr(configuration, "_iocp"):
+        return False
+    configuration._iocp.use_sol = swiglpk.GLP_ON if use else swiglpk.GLP_OFF
+    return use
+
+# keeps one GDP model alive between solves of a slowly changing economy
+# changing an agent's max_time only moves the bound of its time constraint and changing a production's
+# time_needed only rewrites the coefficients of that production in the same row, nothing is rebuilt.
+# with GLPK the previous solution is handed to the solver as the initial integer solution of the next solve,
+# GLPK trusts that solution blindly, so it is only used when it still satisfies the edited time constraints
+class IncrementalModel:
+    def __init__(self, agents, equilibrium="global", name=None):
+        self.agents = list(agents)
+        self.agent_by_id = {agent.id: agent for agent in self.agents}
+        builder = SparseModelBuilder(self.agents).add_batch_constraints().add_time_constraints()
+        builder.add_equilibrium_constraints(equilibrium)
+        self.model = builder.build(name)
+        self.time_constraint_by_id = {
+            agent.id: constraint for agent, constraint in zip(self.agents, builder.constraints_by_kind["time"])}
+        self.presolve = self.model.configuration.presolve
+        # production variable values of the last solution, None until a solution was found
+        self.solution = None
+        self.changed_agents = set()
+        self.warm = False
+        self.solve_time = None
+
+    def set_max_time(self, agent_id, max_time):
+        agent = self.agent_by_id[agent_id]
+        agent.max_time = max_time
+        self.time_constraint_by_id[agent_id].ub = max_time
+        self.changed_agents.add(agent_id)
+
+    def set_time_needed(self, agent_id, production_id, time_needed):
+        prod = self.agent_by_id[agent_id].production_by_id[production_id]
+        prod.time_needed = time_needed
+        self.time_constraint_by_id[agent_id].set_linear_coefficients(
+            {var: time_needed for var in prod.trade_to_vars.values()})
+        self.changed_agents.add(agent_id)
+
+    # the batch and equilibrium constraints never change, so the last solution stays feasible
+    # as long as every changed agent can still produce it in time
+    def solution_feasible(self):
+        if self.solution is None:
+            return False
+        for agent_id in self.changed_agents:
+            agent = self.agent_by_id[agent_id]
+            time_spent = sum(prod.time_needed * self.solution[var.name]
+                             for prod in agent.production for var in prod.trade_to_vars.values())
+            if time_spent > agent.max_time + 1e-6:
+                return False
+        return True
+
+    def optimize(self):
+        configuration = self.model.configuration
+        glpk = isinstance(self.model, glpk_interface.Model)
+        self.warm = use_initial_solution(configuration, glpk and self.solution_feasible())
+        if glpk:
+            # GLPK's MIP presolver drops the initial solution and reports it as optimal, so it is off for warm solves
+            configuration.presolve = False if self.warm else self.presolve
+        start = time.perf_counter()
+        status = self.model.optimize()
+        self.solve_time = time.perf_counter() - start
+
+        self.changed_agents.clear()
+        self.solution = None
+        if has_solution(self.model):
+            self.solution = {var.name: var.primal for agent in self.agents
+                             for prod in agent.production for var in prod.trade_to_vars.values()}
+        return status
+
+if __name__ == "__main__":
+    agent1 = Agent(1, 30, [
+        Production(8, 7),
+        Production(7, 6),
+        Production(3, 4)
+    ])
+    agent2 = Agent(2, 30,[
+        Production(5, 5),
+        Production(2, 3),
+        Production(11, 7)
+    ])
+    agent3 = Agent(3, 30,[
+        Production(4, 3),
+        Production(1, 2),
+        Production(3, 4)
+    ])
+
+    agent_by_id = {
+        1 : agent1,
+        2 : agent2,
+        3 : agent3
+    }
+
+    agents = agent_by_id.values()
+
+    for agent_id in agent_by_id:
+        for other_id in agent_by_id:
+            if agent_id != other_id:
+                agent_by_id[agent_id].add_agent(agent_by_id[other_id])
+
+    # expected solution:
+    # Effective GDP: 119.0
+    # Actor 1 Sales: 32.0, Purchases: 32.0, Time spent: 28.0
+    # Actor 2 Sales: 40.0, Purchases: 40.0, Time spent: 29.0
+    # Actor 3 Sales: 40.0, Purchases: 40.0, Time spent: 30.0
+    builder = SparseModelBuilder(agents)
+    builder.add_batch_constraints()
+
+    # production time constraint Z = 30
+    builder.add_time_constraints()
 
-# global equilibrium constraint
-model.add(global_constraints(agents))
+    # global equilibrium constraint
+    builder.add_global_constraints()
 
-# barter equilibrium constraint
-#model.add(barter_constraints(agents))
+    # barter equilibrium constraint
+    #builder.add_barter_constraints()
 
-status = model.optimize()
+    # Variables, constraints and objective are combined in a Model object, which can subsequently be optimized.
+    model = builder.build(name='Simple model')
+    c_time = builder.constraints_by_kind["time"]
 
-t_1_2 = agent_by_id[1].trade_to_vars[2]
-t_1_3 = agent_by_id[1].trade_to_vars[3]
+    status = model.optimize()
 
-t_2_1 = agent_by_id[2].trade_to_vars[1]
-t_2_3 = agent_by_id[2].trade_to_vars[3]
+    t_1_2 = agent_by_id[1].trade_to_vars[2]
+    t_1_3 = agent_by_id[1].trade_to_vars[3]
 
-t_3_1 = agent_by_id[3].trade_to_vars[1]
-t_3_2 = agent_by_id[3].trade_to_vars[2]
+    t_2_1 = agent_by_id[2].trade_to_vars[1]
+    t_2_3 = agent_by_id[2].trade_to_vars[3]
 
-time_spent_by_id = {}
-for i in range(len(c_time)):
-    time_spent_by_id[i+1] = c_time[i]
+    t_3_1 = agent_by_id[3].trade_to_vars[1]
+    t_3_2 = agent_by_id[3].trade_to_vars[2]
 
-c_time_prod_1 = c_time[0]
-c_time_prod_2 = c_time[1]
-c_time_prod_3 = c_time[2]
+    time_spent_by_id = {}
+    for i in range(len(c_time)):
+        time_spent_by_id[i+1] = c_time[i]
 
-print("----------")
-for var_name, var in model.variables.iteritems():
-    print(var_name, "=", var.primal)
+    c_time_prod_1 = c_time[0]
+    c_time_prod_2 = c_time[1]
+    c_time_prod_3 = c_time[2]
 
-print("status:", model.status)
+    print("----------")
+    for var_name, var in model.variables.iteritems():
+        print(var_name, "=", var.primal)
 
-print("Effective GDP:", model.objective.value)
+    print("status:", model.status)
 
-for agent_id in agent_by_id:
-    agent = agent_by_id[agent_id]
-    sales = 0
-    purchases = 0
-    for other_agent in agent.trade_to_vars:
-        sales += agent_by_id[agent_id].trade_to_vars[other_agent].primal
-        purchases += agent_by_id[other_agent].trade_to_vars[agent_id].primal
-    time_spent = time_spent_by_id[agent_id].primal
+    print("Effective GDP:", model.objective.value)
 
-    print("Actor {3} Sales: {0}, Purchases: {1}, Time spent: {2}".format(
-        sales,
-        purchases,
-        time_spent,
-        agent_id))
\ No newline at end of file
+    for agent_id in agent_by_id:
+        agent = agent_by_id[agent_id]
+        sales = 0
+        purchases = 0
+        for other_agent in agent.trade_to_vars:
+            sales += agent_by_id[agent_id].trade_to_vars[other_agent].primal
+            purchases += agent_by_id[other_agent].trade_to_vars[agent_id].primal
+        time_spent = time_spent_by_id[agent_id].primal
+
+        print("Actor {3} Sales: {0}, Purchases: {1}, Time spent: {2}".format(
+            sales,
+            purchases,
+            time_spent,
+            agent_id))
\ No newline at end of file
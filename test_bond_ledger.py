@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from bond_ledger import BondLedger
+
+# settling three of five contracts drops their rows, the other two keep their ids
+def test_contract_ids_survive_compaction():
+    ledger = BondLedger()
+    contracts = ledger.issue(100, 0.1, 0, [1, 1, 1, 2, 3], [0, 1, 2, 3, 4], 5)
+    settlement = ledger.settle(1)
+    assert settlement.contracts.tolist() == contracts[:3].tolist()
+    assert ledger.size == 2
+    ledger.transfer(contracts[4], 1)
+    assert ledger.portfolio(1).tolist() == [contracts[4]]
+    assert ledger.portfolio(3).tolist() == [contracts[3]]
+    assert ledger.settle(3).holders.tolist() == [1]
+
+def test_settled_contracts_cannot_be_transferred():
+    ledger = BondLedger()
+    contracts = ledger.issue(100, 0.1, 0, [1, 2, 2, 2], 0, 1)
+    ledger.settle(1)
+    with pytest.raises(ValueError):
+        ledger.transfer(contracts[0], 2)
+    with pytest.raises(ValueError):
+        ledger.transfer(contracts[-1] + 1, 2)
+    ledger.transfer(contracts[1:], 2)
+    np.testing.assert_array_equal(ledger.portfolio(2), contracts[1:])
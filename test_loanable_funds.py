@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from loanable_funds import LoanableFundsMarket, match_contracts
+
+# tries every reservation rate, largest volume first, then smallest imbalance, then lowest rate
+def brute_force_clearing(rates, supply, demand):
+    best = None
+    for rate in sorted(set(rates)):
+        lent = supply[rates <= rate].sum()
+        borrowed = demand[rates >= rate].sum()
+        key = (-min(lent, borrowed), abs(lent - borrowed), rate)
+        if best is None or key < best:
+            best = key
+    return best[2], -best[0]
+
+# walks both lines of amounts one contract at a time
+def brute_force_contracts(lent, borrowed):
+    contracts = []
+    lenders = [[i, amount] for i, amount in enumerate(lent) if amount > 0]
+    borrowers = [[j, amount] for j, amount in enumerate(borrowed) if amount > 0]
+    while lenders and borrowers:
+        amount = min(lenders[0][1], borrowers[0][1])
+        contracts.append((lenders[0][0], borrowers[0][0], amount))
+        lenders[0][1] -= amount
+        borrowers[0][1] -= amount
+        if lenders[0][1] == 0:
+            lenders.pop(0)
+        if borrowers[0][1] == 0:
+            borrowers.pop(0)
+    return contracts
+
+@pytest.mark.parametrize("seed", range(30))
+def test_clearing_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    agents = rng.integers(1, 40)
+    market = LoanableFundsMarket(agents)
+    # few distinct rates and whole amounts, so equal rates and ties in volume and imbalance come up
+    lenders = rng.random(agents) < 0.5
+    market.set_amounts(np.where(lenders, rng.integers(0, 20, agents), 0), np.where(lenders, 0, rng.integers(0, 20, agents)))
+    market.set_rates(np.arange(agents), rng.integers(1, 6, agents) / 100)
+    for _ in range(3):
+        changed = rng.choice(agents, rng.integers(1, agents + 1), replace=False)
+        market.set_rates(changed, rng.integers(1, 6, len(changed)) / 100)
+        assert np.all(np.diff(market.rates[market.order]) >= 0)
+        assert sorted(market.order) == list(range(agents))
+        clearing = market.clear()
+        rate, volume = brute_force_clearing(market.rates, market.supply, market.demand)
+        if volume == 0:
+            assert clearing.volume == 0 and np.isnan(clearing.rate)
+            continue
+        assert (clearing.rate, clearing.volume) == (rate, volume)
+        lent = market.supply * (market.rates <= rate)
+        borrowed = market.demand * (market.rates >= rate)
+        np.testing.assert_allclose(clearing.lent, lent * volume / lent.sum())
+        np.testing.assert_allclose(clearing.borrowed, borrowed * volume / borrowed.sum())
+
+@pytest.mark.parametrize("seed", range(10))
+def test_contracts_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    lent = rng.integers(0, 10, rng.integers(1, 30)).astype(float)
+    borrowed = np.zeros(rng.integers(1, 30))
+    # the same total on both sides, split at random among the borrowers
+    borrowed[:] = np.bincount(rng.integers(0, len(borrowed), int(lent.sum())), minlength=len(borrowed))
+    lenders, borrowers, amounts = match_contracts(lent, borrowed)
+    assert list(zip(lenders.tolist(), borrowers.tolist(), amounts.tolist())) == brute_force_contracts(lent, borrowed)
+
+def test_contracts_of_a_clearing_add_up():
+    rng = np.random.default_rng(0)
+    market = LoanableFundsMarket(1000)
+    lenders = rng.random(1000) < 0.3
+    market.set_amounts(np.where(lenders, rng.uniform(0, 100, 1000), 0), np.where(lenders, 0, rng.uniform(0, 100, 1000)))
+    market.set_rates(np.arange(1000), rng.uniform(0.01, 0.2, 1000))
+    clearing = market.clear()
+    lenders, borrowers, amounts = match_contracts(clearing.lent, clearing.borrowed)
+    assert len(amounts) < np.count_nonzero(clearing.lent) + np.count_nonzero(clearing.borrowed)
+    np.testing.assert_allclose(np.bincount(lenders, amounts, minlength=1000), clearing.lent, atol=1e-9)
+    np.testing.assert_allclose(np.bincount(borrowers, amounts, minlength=1000), clearing.borrowed, atol=1e-9)
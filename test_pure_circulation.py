@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from pure_circulation import (
+    CHECKPOINT_AGGREGATES, CHECKPOINT_ARRAYS, PERSON_STATE, InvariantChecker, MoneyLeakError, Person, ShockSchedule,
+    Simulation, VectorizedSimulation)
+
+# a random economy of Person objects run by Simulation and its copy run by VectorizedSimulation
+def random_simulations(seed, rounds):
+    rng = np.random.default_rng(seed)
+    agents = rng.integers(2, 20)
+    shocks = ShockSchedule().add("max_debt", rng.integers(1, rounds), rng.choice([0, 10, 25]))
+    # a shock of scenario 0 and one of every scenario due together, declared in either order
+    both = rng.integers(1, rounds)
+    own, everyone = rng.choice([0, 10, 25, 40], size=2, replace=False)
+    if rng.random() < 0.5:
+        shocks.add("max_debt", both, own, scenarios=0).add("max_debt", both, everyone)
+    else:
+        shocks.add("max_debt", both, everyone).add("max_debt", both, own, scenarios=0)
+    sim = Simulation(shocks=shocks)
+    sim.people = [
+        Person(rng.uniform(0.3, 0.9), rng.choice([0, 30, 60]), rng.choice([0, 25, 50])) for _ in range(agents)]
+    return sim, VectorizedSimulation.from_people(sim.people, shocks=shocks)
+
+@pytest.mark.parametrize("seed", range(20))
+def test_vectorized_simulation_matches_people(seed):
+    sim, vectorized = random_simulations(seed, rounds=30)
+    for _ in range(30):
+        sim.round()
+        vectorized.round()
+        assert vectorized.round_index == sim.round_index
+        for name in PERSON_STATE + ["max_debt"]:
+            np.testing.assert_allclose(vectorized.column(name), sim.column(name), rtol=1e-9, atol=1e-9, err_msg=name)
+        for name in CHECKPOINT_AGGREGATES:
+            np.testing.assert_allclose(getattr(vectorized, name), getattr(sim, name), rtol=1e-9, atol=1e-9, err_msg=name)
+
+def test_rounds_count_from_current_round():
+    sim = VectorizedSimulation.from_people(Simulation().people)
+    assert [snapshot.round_index for snapshot in sim.rounds(3)] == [1, 2, 3]
+    assert [snapshot.round_index for snapshot in sim.rounds(3)] == [4, 5, 6]
+
+def test_shocks_with_several_scenario_axes():
+    shocks = ShockSchedule().add("max_debt", 1, [0, 10], [0, 2])
+    sim = VectorizedSimulation(0.6, 0, np.full((3, 2, 4), 50.0), shocks=shocks)
+    list(sim.rounds(1))
+    np.testing.assert_array_equal(sim.max_debt[:, 0, 0], [0, 50, 10])
+    np.testing.assert_array_equal(sim.max_debt, sim.max_debt[:, :1, :1] * np.ones((3, 2, 4)))
+
+def test_shocked_people_report_plain_numbers(capsys):
+    sim = Simulation(ShockSchedule().add("max_debt", 1, 0).add("consumption_rate", 1, 0.7))
+    sim.round()
+    assert type(sim.people[0].max_debt) is int and type(sim.people[0].consumption_rate) is float
+    sim.report()
+    assert "Max Debt 0\n" in capsys.readouterr().out
+
+# rounds replayed from a checkpoint, including a shock still pending at the checkpoint, match the original run bit for bit
+def test_checkpoint_replay_is_bit_identical(tmp_path):
+    rng = np.random.default_rng(7)
+    shocks = ShockSchedule().add("max_debt", 8, 0).add("consumption_rate", 12, rng.uniform(0.5, 0.9, 4), np.arange(4))
+    sim = VectorizedSimulation(
+        rng.uniform(0.3, 0.9, (4, 6)), rng.choice([0, 30, 60], (4, 6)), rng.choice([0, 25, 50], (4, 6)), shocks=shocks)
+    list(sim.rounds(5))
+    path = str(tmp_path / "warm")
+    sim.save_checkpoint(path)
+    original = [snapshot for snapshot in sim.rounds(15)]
+    replay = VectorizedSimulation.load_checkpoint(path)
+    assert replay.round_index == 5
+    for expected, snapshot in zip(original, replay.rounds(15)):
+        assert snapshot.round_index == expected.round_index
+        for name in expected._fields[1:]:
+            np.testing.assert_array_equal(getattr(snapshot, name), getattr(expected, name), err_msg=name)
+    for name in CHECKPOINT_ARRAYS:
+        np.testing.assert_array_equal(getattr(replay, name), getattr(sim, name), err_msg=name)
+
+# a checker that makes money disappear in one phase of round 3 before checking it
+class LeakingChecker(InvariantChecker):
+    def __init__(self, phase, leak):
+        InvariantChecker.__init__(self)
+        self.phase = phase
+        self.leak = leak
+
+    def check_allocation(self, sim):
+        self.leak_in(sim, "allocation")
+        InvariantChecker.check_allocation(self, sim)
+
+    def check_clearing(self, sim):
+        self.leak_in(sim, "clearing")
+        InvariantChecker.check_clearing(self, sim)
+
+    def check_market(self, sim):
+        self.leak_in(sim, "market")
+        InvariantChecker.check_market(self, sim)
+
+    def leak_in(self, sim, phase):
+        if phase == self.phase and sim.round_index == 2:
+            self.leak(sim)
+
+@pytest.mark.parametrize("phase, person", [("allocation", 2), ("clearing", 1), ("market", None)])
+def test_invariant_checker_finds_the_leak(phase, person):
+    def leak(sim):
+        if person is None:
+            sim.next_income[1] *= 0.5
+        else:
+            sim.consumed_income[1, person] -= 5
+    sim = VectorizedSimulation.from_people(Simulation().people, scenarios=3)
+    sim.checker = LeakingChecker(phase, leak)
+    with pytest.raises(MoneyLeakError) as error:
+        list(sim.rounds(5))
+    assert error.value.leak[:4] == (3, phase, (1,), person)
+    if person is not None:
+        assert error.value.leak.amount == pytest.approx(-5)
+
+def test_invariant_checker_passes_without_leaks():
+    sim = VectorizedSimulation.from_people(Simulation().people, scenarios=3)
+    sim.checker = InvariantChecker()
+    list(sim.rounds(20))
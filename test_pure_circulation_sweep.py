@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from pure_circulation import ShockSchedule, VectorizedSimulation
+from pure_circulation_sweep import AGGREGATES, ParameterGrid, Sweep
+
+def small_grid():
+    return ParameterGrid(
+        3,
+        consumption_rate=[0.6, 0.8],
+        max_saving=[(saving, 0, 0) for saving in (0, 60, 120)],
+        max_debt=[(0, debt, debt) for debt in (0, 50)])
+
+# a shock of a single grid point hits that point whichever chunk it ends up in
+def test_scenario_shocks_follow_grid_points(tmp_path):
+    grid = small_grid()
+    shocks = ShockSchedule().add("max_debt", 3, 0).add("max_debt", 2, 10, scenarios=[4, 9])
+    results = Sweep(grid, 8, str(tmp_path / "sweep"), chunk_size=5, shocks=shocks).run(processes=1)
+    sim = VectorizedSimulation(*grid.scenarios(0, len(grid)), grid.productivity, shocks=shocks)
+    for i in range(8):
+        sim.round()
+        for j, name in enumerate(AGGREGATES):
+            np.testing.assert_allclose(results[:, i, j], getattr(sim, name), err_msg=name)
+
+def test_resume_refuses_a_different_sweep(tmp_path):
+    path = str(tmp_path / "sweep")
+    shocks = ShockSchedule().add("max_debt", 3, 0)
+    assert len(Sweep(small_grid(), 4, path, chunk_size=5, shocks=shocks).pending()) == 3
+    assert len(Sweep(small_grid(), 4, path, chunk_size=5, shocks=ShockSchedule().add("max_debt", 3, 0)).pending()) == 3
+    with pytest.raises(ValueError):
+        Sweep(small_grid(), 4, path, chunk_size=5, shocks=ShockSchedule().add("max_debt", 2, 0)).pending()
+    with pytest.raises(ValueError):
+        Sweep(small_grid(), 4, path, chunk_size=5).pending()
+    other_grid = small_grid()
+    other_grid.axes[0] = other_grid.axes[0] + 0.1
+    with pytest.raises(ValueError):
+        Sweep(other_grid, 4, path, chunk_size=5, shocks=shocks).pending()
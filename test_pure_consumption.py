@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from pure_consumption import Simulation, call_auction
+
+# nobody sells into their own consumption or spends cash they do not have, whatever rests in the order books
+@pytest.mark.parametrize("seed", range(10))
+def test_order_book_keeps_consumption_reserve(seed):
+    rng = np.random.default_rng(seed)
+    sim = Simulation("order_book")
+    sim.table.cash[:] = rng.uniform(0, 20, len(sim.people))
+    sim.table.inventory[:, sim.good_ids] = rng.integers(0, 10, (len(sim.people), len(sim.goods)))
+    for _ in range(10):
+        sim.produce()
+        reserve = np.minimum(sim.table.inventory[:, sim.good_ids], sim.desired)
+        sim.trade()
+        assert (sim.table.inventory[:, sim.good_ids] >= reserve - 1e-9).all()
+        assert (sim.table.cash >= -1e-9).all()
+        sim.consumption()
+
+# clearing price with the largest volume, then the smallest imbalance, then the lowest price, over all offer prices
+def brute_force_auction(bid_prices, bid_quantities, ask_prices, ask_quantities):
+    best = None
+    for price in sorted(set(bid_prices[bid_quantities > 0]) | set(ask_prices[ask_quantities > 0])):
+        supply = ask_quantities[ask_prices <= price].sum()
+        demand = bid_quantities[bid_prices >= price].sum()
+        key = (-min(supply, demand), abs(supply - demand), price)
+        if best is None or key < best:
+            best = key
+    return (np.nan, 0.0) if best is None or best[0] == 0 else (best[2], -best[0])
+
+def test_call_auction_matches_brute_force():
+    rng = np.random.default_rng(0)
+    goods, offers = 3000, 4
+    bid_prices = rng.integers(1, 6, (goods, offers)).astype(float)
+    ask_prices = rng.integers(1, 6, (goods, offers)).astype(float)
+    # some offers are padding
+    bid_quantities = rng.integers(0, 4, (goods, offers)).astype(float)
+    ask_quantities = rng.integers(0, 4, (goods, offers)).astype(float)
+    result = call_auction(bid_prices, bid_quantities, ask_prices, ask_quantities)
+    for g in range(goods):
+        price, volume = brute_force_auction(bid_prices[g], bid_quantities[g], ask_prices[g], ask_quantities[g])
+        np.testing.assert_equal(result.prices[g], price)
+        assert result.volumes[g] == volume
+        assert result.bid_fills[g].sum() == pytest.approx(volume)
+        assert result.ask_fills[g].sum() == pytest.approx(volume)
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from pure_optimization_cache import SolutionCache, relabel, solve_cached
+from pure_optimization_lib import generate_economy, solve_spec
+
+# a cache hit for a relabeled economy is the stored solution with every agent mapped back to its own label
+@pytest.mark.parametrize("graph", ["complete", "small_world"])
+def test_permuted_cache_hit_maps_agents_back(tmp_path, graph):
+    spec = generate_economy(5, graph=graph, degree=2, seed=3)._replace(max_time=[20, 25, 30, 35, 40])
+    cache = SolutionCache(str(tmp_path))
+    first = solve_cached(spec, cache)
+    assert first.objective == pytest.approx(solve_spec(spec).objective)
+    rng = np.random.default_rng(0)
+    for _ in range(4):
+        order = rng.permutation(5)
+        result = solve_cached(relabel(spec, order), cache)
+        assert result.objective == first.objective
+        np.testing.assert_array_equal(result.sales, first.sales[order])
+        np.testing.assert_array_equal(result.purchases, first.purchases[order])
+        np.testing.assert_array_equal(result.time_spent, first.time_spent[order])
+        assert np.all(result.time_spent <= np.array(spec.max_time)[order] + 1e-9)
+    assert (cache.hits, cache.misses) == (4, 1)
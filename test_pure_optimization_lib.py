@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+import pure_optimization_lib
+from pure_optimization_lib import Agent, BarterCycleModel, EconomySpec, Production
+
+# the same economy with agent i numbered ids[i]
+def agents_with_ids(spec, ids):
+    agents = [
+        Agent(ids[i], spec.max_time[i], [Production(batch_size, time_needed) for batch_size, time_needed in spec.productions[i]])
+        for i in range(len(spec.max_time))
+    ]
+    for i, j in spec.edges:
+        agents[i].add_agent(agents[j])
+        agents[j].add_agent(agents[i])
+    return agents
+
+# a ring of four agents, agents 0 and 2 as well as 1 and 3 cannot trade directly
+RING = EconomySpec(
+    [30, 30, 30, 30],
+    [[(8, 7), (3, 4)], [(5, 5), (11, 7)], [(4, 3), (1, 2)], [(6, 4), (2, 3)]],
+    [(0, 1), (1, 2), (2, 3), (3, 0)])
+
+@pytest.mark.parametrize("ids", [[10, 20, 30, 40], [3, 1, 4, 2]])
+def test_barter_cycles_with_any_agent_ids(ids):
+    expected = BarterCycleModel(pure_optimization_lib.build_agents(RING), max_length=4)
+    expected.optimize()
+
+    cycle_model = BarterCycleModel(agents_with_ids(RING, ids), max_length=4)
+    edges = {(ids[i], ids[j]) for i, j in RING.edges} | {(ids[j], ids[i]) for i, j in RING.edges}
+    for cycle in cycle_model.relaxation_cycles():
+        assert set(zip(cycle, cycle[1:] + cycle[:1])) <= edges
+    cycle_model.optimize()
+    assert cycle_model.model.objective.value == pytest.approx(expected.model.objective.value)
+    assert cycle_model.bound == pytest.approx(expected.bound)
+
+def test_incremental_model_warm_starts_only_from_feasible_solutions():
+    incremental = pure_optimization_lib.IncrementalModel(pure_optimization_lib.build_agents(RING))
+    incremental.optimize()
+    assert not incremental.warm
+    incremental.set_max_time(1, 40)
+    incremental.optimize()
+    assert incremental.warm
+    cold = pure_optimization_lib.IncrementalModel(pure_optimization_lib.build_agents(RING))
+    cold.set_max_time(1, 40)
+    cold.optimize()
+    assert incremental.model.objective.value == pytest.approx(cold.model.objective.value)
+    incremental.set_max_time(1, 1)
+    incremental.optimize()
+    assert not incremental.warm
+
+def test_warm_start_needs_glpk_parameters():
+    assert not pure_optimization_lib.use_initial_solution(object(), True)
+
+# pricing finds cycles of three after the first LP, so the columns are priced again
+def test_barter_cycles_priced_in_several_iterations():
+    spec = pure_optimization_lib.generate_economy(5, graph="small_world", degree=4, seed=1)
+    cycle_model = BarterCycleModel(pure_optimization_lib.build_agents(spec), max_length=3)
+    cycle_model.optimize()
+    assert cycle_model.iterations >= 2
+    assert any(len(cycle) == 3 for cycle in cycle_model.cycle_vars)
+    assert all(var.type == "integer" for var in cycle_model.model.variables)
+    assert cycle_model.model.objective.value <= cycle_model.bound + 1e-6
+
+def test_hand_over_cycles():
+    selling = np.array([True, True, True, True, True, False, True])
+    buyer = np.array([2, 0, 1, 4, 3, 6, 5])
+    cycles, lengths = pure_optimization_lib.hand_over_cycles(selling, buyer)
+    assert [cycle[:length].tolist() for cycle, length in zip(cycles, lengths)] == [[0, 2, 1], [3, 4]]
+
+# the repaired subproblems find balanced trades that pairwise barter misses
+def test_lagrangian_repair_beats_barter():
+    spec = pure_optimization_lib.generate_economy(5, seed=4)
+    barter = pure_optimization_lib.trade_result(spec, *pure_optimization_lib.barter_trades(spec), status="feasible")
+    decomposition = pure_optimization_lib.solve_lagrangian(spec)
+    result = decomposition.result
+    assert barter.objective < result.objective <= decomposition.bound
+    np.testing.assert_array_equal(result.sales, result.purchases)
+    assert (result.time_spent <= np.array(spec.max_time) + 1e-9).all()
+
+# an economy with dominated productions, a production that never fits and interchangeable agents
+DOMINATED = EconomySpec(
+    [30, 30, 30, 24],
+    [[(6, 6), (6, 9), (2, 4)], [(6, 6), (2, 4), (2, 5)], [(5, 5), (11, 31)], [(4, 3), (4, 3), (1, 2)]],
+    None)
+
+@pytest.mark.parametrize("equilibrium", ["global", "barter"])
+@pytest.mark.parametrize("spec", [
+    DOMINATED, DOMINATED._replace(edges=[(0, 2), (1, 2), (2, 3), (0, 3), (1, 3)]), RING,
+    pure_optimization_lib.generate_economy(4, seed=2)])
+def test_presolve_keeps_the_objective(spec, equilibrium):
+    plain = pure_optimization_lib.solve_spec(spec, equilibrium)
+    presolved = pure_optimization_lib.solve_spec(spec, equilibrium, presolved=True)
+    assert presolved.status == plain.status == "optimal"
+    assert presolved.objective == pytest.approx(plain.objective)
+
+def test_presolve_report():
+    _, report = pure_optimization_lib.presolve(DOMINATED)
+    assert report.removed_productions == 4
+    assert report.symmetry_classes == [[1, 2]]
+
+# the GDP model with every constraint, solved without integrality
+def full_relaxation(spec, equilibrium):
+    agents = pure_optimization_lib.build_agents(spec)
+    builder = pure_optimization_lib.SparseModelBuilder(agents).add_batch_constraints().add_time_constraints()
+    model = builder.add_equilibrium_constraints(equilibrium).build()
+    for var in model.variables:
+        var.type = "continuous"
+    assert model.optimize() == "optimal"
+    return model.objective.value
+
+@pytest.mark.parametrize("equilibrium", ["global", "barter"])
+@pytest.mark.parametrize("spec", [
+    DOMINATED, RING, EconomySpec([30, 30, 30], [[(12, 2)], [(1, 8)], [(2, 8)]], None),
+    pure_optimization_lib.generate_economy(6, seed=5),
+    pure_optimization_lib.generate_economy(8, graph="small_world", degree=2, seed=5),
+    pure_optimization_lib.generate_economy(8, graph="regional", degree=1, regions=3, seed=6)])
+def test_relaxation_bound_is_the_lp_relaxation(spec, equilibrium):
+    bound = pure_optimization_lib.relaxation_bound(spec, pure_optimization_lib.build_agents(spec), equilibrium)
+    assert bound == pytest.approx(full_relaxation(spec, equilibrium))